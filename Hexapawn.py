@@ -1,155 +1,327 @@
 # create the board class to simulate hexapawn games
 
 
+def _bitList(mask, size):
+    """
+    expands a bitboard into a list of ones and zeros, square 0 first
+    """
+    return [(mask >> i) & 1 for i in range(size)]
+
+
+class Geometry:
+    """
+    All the tables the Board needs that only depend on the size of the board. Squares are numbered row by row from the top left like on the 3x3 board,
+    black starts on the top row and white on the bottom row. They are built once per size by Geometry.get and shared by every board of that size
+        1. pushes and captures tables giving the destination squares of a pawn of each colour on each square
+        2. masks of the last rank of each colour
+        3. the outputIndex dictionary mapping white moves to policy outputs and the outputMoves list mapping them back. Pushes come first from the bottom row up,
+           then captures in the same order, which gives exactly the old 14 entry table on the 3x3 board
+        4. lookup tables of the bitboards expanded to lists for toNetworkInput, only for small boards as they have 2^squares entries
+        5. the left-right mirror image of every square and of every policy output, used by the symmetry module
+        6. the policy output of every move of either colour keyed by the move tuple itself, and the same indices laid out like the push and capture tables
+           so generateMoves can hand them out together with the moves
+    """
+    cache = {}
+
+    @classmethod
+    def get(cls, width, height):
+        if (width, height) not in cls.cache:
+            cls.cache[(width, height)] = cls(width, height)
+        return cls.cache[(width, height)]
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.squares = width * height
+
+        self.whitePushes = [] # destination of the pawn push for each square, None if the pawn is already on the last rank
+        self.blackPushes = []
+        self.whiteCaptures = [] # list of possible capture destination for each square on the board, to help with the tricky legal moves generation
+        self.blackCaptures = []
+        for i in range(self.squares):
+            row, column = divmod(i, width)
+            self.whitePushes.append(i - width if row > 0 else None)
+            self.blackPushes.append(i + width if row < height - 1 else None)
+            sideways = [c for c in (column - 1, column + 1) if 0 <= c < width]
+            self.whiteCaptures.append([(row - 1) * width + c for c in sideways] if row > 0 else [])
+            self.blackCaptures.append([(row + 1) * width + c for c in sideways] if row < height - 1 else [])
+
+        self.whiteLastRank = (1 << width) - 1
+        self.blackLastRank = self.whiteLastRank << (self.squares - width)
+
+        self.outputIndex = {} # cache for storing corresponding output for possible moves for easy conversion. Only stores possible white moves as black moves are rotated
+        self.outputMoves = [] # the other way round, the white move of every output index
+        for table in ([[push] if push is not None else [] for push in self.whitePushes], self.whiteCaptures):
+            for row in range(height - 1, 0, -1):
+                for i in range(row * width, (row + 1) * width):
+                    for destination in table[i]:
+                        self.outputIndex[str((i, destination))] = len(self.outputMoves)
+                        self.outputMoves.append((i, destination))
+        self.policySize = len(self.outputMoves)
+
+        last = self.squares - 1
+        self.moveIndex = {} # output index of every white and black move, black moves go down the board so they never clash with white ones
+        for index, (start, end) in enumerate(self.outputMoves):
+            self.moveIndex[(start, end)] = index
+            self.moveIndex[(last - start, last - end)] = index # the black move that is this white move on the rotated board
+        self.whitePushIndex = [self.moveIndex[(i, push)] if push is not None else None for i, push in enumerate(self.whitePushes)]
+        self.blackPushIndex = [self.moveIndex[(i, push)] if push is not None else None for i, push in enumerate(self.blackPushes)]
+        self.whiteCaptureIndex = [[self.moveIndex[(i, capture)] for capture in captures] for i, captures in enumerate(self.whiteCaptures)]
+        self.blackCaptureIndex = [[self.moveIndex[(i, capture)] for capture in captures] for i, captures in enumerate(self.blackCaptures)]
+
+        self.mirrorSquares = [(i // width) * width + (width - 1 - i % width) for i in range(self.squares)] # square on the other side of the board, left and right swapped
+        self.policyMirror = [self.outputIndex[str((self.mirrorSquares[start], self.mirrorSquares[end]))] for (start, end) in self.outputMoves] # output index of the mirrored move
+
+        if self.squares <= 12: # every possible bitboard expanded to a list, so encoding is a lookup instead of a loop
+            self.bits = [_bitList(mask, self.squares) for mask in range(1 << self.squares)]
+            self.bitsRotated = [bits[::-1] for bits in self.bits]
+        else:
+            self.bits = None
+            self.bitsRotated = None
+
+
 class Board():
     """
     Board instance contains a number of instance variables
-        1. The board to store location of pieces, represented by a list with index of all squares and different ints to represent piece types
+        1. The board to store location of pieces. It used to be a list with an int for every square but it is now two integers (bitboards), one for the white pawns
+           and one for the black pawns, where bit i is set if there is a pawn of that colour on square i. The old list is still available through the board property.
         2. The player whose turn it is to play, this breaks my intuition a bit because I expected that to be part of the game loop or something, neccesary if the board is
            to be able to generate its own legal moves.
-        3. The Output index dictionary to store the corresponding output index of given moves in the Neural Network. 
+        3. The Output index dictionary to store the corresponding output index of given moves in the Neural Network.
            This seems to put the idea of the Neural Net into the structure of the the Board class,
            this in my opinion affects modularity so changing it to an external function is something to keep in mind
-        4. Captures lists to help with move generation
-        5. A legal moves cache to store the legal moves in a current position after generated
+        4. The geometry holding the captures lists and push tables that help with move generation, these depend on the size of the board and are shared by every board of that size
+        5. Caches of the legal moves, their network output indices and the terminal status of the current position, worked out at most once per position.
+           applymove clears them and undomove puts back the ones of the position it returns to
+        6. A history of previous bitboards, with their caches, so moves can be taken back
     Board instance also contains important methods
         1. method to set the starting position of the board by altering the board storage list
         2. method to get the indices of possible moves as that will serve as inputs to the Neural Network
-        3. method to play a move on the board 
+        3. method to play a move on the board and another to take it back
         4. method to generate legal moves, as I hinted at earlier, I'd probably have thought to have an external function determine the legal moves but this seems to be the convetion
         5. method for checking if it is a terminal position
         6. method for encoding the board position as a neural network input
-        Interestinglg enough it lacks pop method to undo moves
+        7. methods for cheaply copying the board and getting a hashable key of the position
+        8. method to look the position up in the solved game table of the oracle module
     """
     EMPTY = 0 # different ints to represent white and black pieces and empty squares
     WHITE = 1
     BLACK = 2
 
-    def __init__(self):
+    def __init__(self, width=3, height=3):
+        self.geometry = Geometry.get(width, height) # every table that depends on the size of the board, shared by all boards of that size
         self.turn = self.WHITE # game starts off with white to play
+        self.white = 0 # board is initialised as empty, could be initialised with starting position but that's left as an external method
+        self.black = 0
+        self.legal_moves = None
+        self.move_indices = None
+        self.terminal = None
+        self.history = []
+
+    @property
+    def width(self):
+        return self.geometry.width
+
+    @property
+    def height(self):
+        return self.geometry.height
 
-        self.WHITE_PAWN_CAPTURES = [ # list of possible capture destination for each square on the board, to help with the tricky legal moves generation
-            [] ,
-            [] ,
-            [] ,
-            [1] ,
-            [0 ,2] ,
-            [1] ,
-            [4] ,
-            [3 ,5] ,
-            [4]
-            ]
-        self.BLACK_PAWN_CAPTURES = [
-            [4] ,
-            [3 ,5] ,
-            [4] ,
-            [7] ,
-            [6 ,8] ,
-            [7] ,
-            [] ,
-            [] ,
-            []
-            ]
-
-        self.outputIndex = {} # cache for storing corresponding output for possible moves for easy conversion. Only stores possible white moves as will be explained later
-        self.outputIndex["(6, 3)"] = 0
-        self.outputIndex["(7, 4)"] = 1
-        self.outputIndex["(8, 5)"] = 2
-        self.outputIndex["(3, 0)"] = 3
-        self.outputIndex["(4, 1)"] = 4
-        self.outputIndex["(5, 2)"] = 5
-        self.outputIndex["(6, 4)"] = 6
-        self.outputIndex["(7, 3)"] = 7
-        self.outputIndex["(7, 5)"] = 8
-        self.outputIndex["(8, 4)"] = 9
-        self.outputIndex["(3, 1)"] = 10
-        self.outputIndex["(4, 0)"] = 11
-        self.outputIndex["(4, 2)"] = 12
-        self.outputIndex["(5, 1)"] = 13
-        
-        self.board = [self.EMPTY, self.EMPTY, self.EMPTY,
-                      self.EMPTY, self.EMPTY, self.EMPTY,
-                      self.EMPTY, self.EMPTY, self.EMPTY] # board is initialised as empty, could be initialised with starting position but that's left as an external method
+    @property
+    def outputIndex(self):
+        return self.geometry.outputIndex
+
+    @property
+    def policySize(self):
+        """
+        number of outputs of the policy head, 14 on the normal 3x3 board
+        """
+        return self.geometry.policySize
+
+    @property
+    def inputSize(self):
+        """
+        length of toNetworkInput, 18 on the normal 3x3 board
+        """
+        return 2 * self.geometry.squares
+
+    @property
+    def board(self):
+        """
+        the old list representation of the board, built from the bitboards. Only meant for printing and for code that wants to look at single squares
+        """
+        return [self.WHITE if (self.white >> i) & 1 else self.BLACK if (self.black >> i) & 1 else self.EMPTY for i in range(self.geometry.squares)]
+
+    @board.setter
+    def board(self, squares):
+        self.white = 0
+        self.black = 0
+        for i, piece in enumerate(squares):
+            if piece == self.WHITE:
+                self.white |= 1 << i
+            elif piece == self.BLACK:
+                self.black |= 1 << i
+        self.clearCache()
 
     def setStartingPosition(self):
-        self.board = [self.BLACK, self.BLACK, self.BLACK,
-                      self.EMPTY, self.EMPTY, self.EMPTY,
-                      self.WHITE, self.WHITE, self.WHITE] # arranges board to starting position, leaving it as a different method definetly 
-                                                          # helps with flexibility like say rearranging the same Board object
+        self.white = self.geometry.blackLastRank # arranges board to starting position (the row black is trying to reach), leaving it as a different method definetly
+        self.black = self.geometry.whiteLastRank # helps with flexibility like say rearranging the same Board object
+        self.clearCache()
+
+    def clearCache(self):
+        """
+        forgets the legal moves and terminal status, has to be called by anything that changes white, black or turn directly instead of through applymove
+        """
+        self.legal_moves = None
+        self.move_indices = None
+        self.terminal = None
+
+    def key(self):
+        """
+        packs the whole position into a single int, white pawns in the lowest bits (9 of them on a 3x3 board), black pawns in the next ones and the turn in the last bit.
+        Two boards of the same size share a key exactly when they are the same position so it can be used in dictionaries and transposition tables
+        """
+        squares = self.geometry.squares
+        return self.white | (self.black << squares) | ((self.turn == self.BLACK) << (2 * squares))
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def __eq__(self, other):
+        return isinstance(other, Board) and self.key() == other.key()
+
+    def copy(self):
+        """
+        returns a new board with the same position. Much cheaper than copy.deepcopy as all that needs copying is 3 ints, the geometry is shared.
+        The copy starts with an empty history so it can't undo the moves that led to the position, a copy that kept them would hold on to every earlier
+        position with its cached moves, which adds up over the thousands of boards in a search tree. Use applymove and undomove on the board itself to take moves back
+        """
+        board = Board.__new__(Board)
+        board.geometry = self.geometry
+        board.turn = self.turn
+        board.white = self.white
+        board.black = self.black
+        board.legal_moves = self.legal_moves # the caches are never changed in place, only replaced, so they can be shared
+        board.move_indices = self.move_indices
+        board.terminal = self.terminal
+        board.history = []
+        return board
+
+    def __copy__(self):
+        return self.copy()
+
+    def __deepcopy__(self, memo):
+        return self.copy() # nothing in the board is shared so a normal copy is already a deep one
+
+    def lookup(self, oracle):
+        """
+        perfect play information about the position (value, best moves...) from a solved oracle.OracleTable, see the oracle module for the fields
+        """
+        return oracle.lookup(self)
 
     def getNetworkOutputIndex(self, move):
         """
         converts board moves to output index of the Neural Network. The Neural Network to be created only looks at positions from the perspective of the player to move,
-        so all black moves can be mapped to the corresponding white move on a rotated board and then converted using the outputIndex cache
+        so all black moves are mapped to the corresponding white move on a rotated board, the geometry has that worked out already for every move of either colour.
+        For all the legal moves of a position at once moveIndices is cheaper
         """
-        if move[0] > move[1]: # condition to check if it is a white move
-            return self.outputIndex[str(move)]
-        else:
-            return self.outputIndex[str((8-move[0], 8-move[1]))] # subtracting a position from 8 inverts it on the storage list and rotates it on the board
+        return self.geometry.moveIndex[move]
 
     def applymove(self, move):
         """
-        plays a specified move on the board. The legality of the move is not checked and wrongs move may throw an error or more likely and much worse make pieces do the impossible, 
+        plays a specified move on the board. The legality of the move is not checked and wrongs move may throw an error or more likely and much worse make pieces do the impossible,
         therefore it is assumed that anywhere the method is used, the moves were taken directly from generated legal moves.
         Moves are represented as tuples of starting piece position and ending piece position.
         Since pieces can't move backwards there is no ambiguity of which player the move applies to.
         """
-        self.board[move[1]] = self.board[move[0]] # move whatever is on the starting square to the destination square. 
-        self.board[move[0]] = self.EMPTY # convert the starting square to an empty square to show the piece has left
-        if self.turn == self.WHITE: # change the whose turn it is to play
-            self.turn = self.BLACK
+        self.history.append((self.white, self.black, self.legal_moves, self.move_indices, self.terminal)) # remember the position and what is known about it so undomove can restore it
+        start = 1 << move[0]
+        end = 1 << move[1]
+        if self.turn == self.WHITE: # move the pawn from the starting square to the destination square and remove whatever was captured there
+            self.white ^= start | end
+            self.black &= ~end
+            self.turn = self.BLACK # change the whose turn it is to play
         else:
+            self.black ^= start | end
+            self.white &= ~end
             self.turn = self.WHITE
-        self.legal_moves = None # reset the list of legal moves
+        self.legal_moves = None # reset the list of legal moves and everything else known about the old position
+        self.move_indices = None
+        self.terminal = None
+
+    def undomove(self):
+        """
+        takes back the last move played with applymove, the board.pop() it used to lack. Lets the minimax and MCTS walk the tree on a single board instead of copying it
+        """
+        self.white, self.black, self.legal_moves, self.move_indices, self.terminal = self.history.pop()
+        self.turn = self.BLACK if self.turn == self.WHITE else self.WHITE
 
-    def generateMoves(self): 
+    def generateMoves(self):
         """
           The heart of the class, the bane of my existence for chess but for a simple game like Hexapawn, it is not that bad.
-          The legal moves are generated by looping through all squares, checking if there's a piece on it, 
-          generating all moves it could probably make and checking if they are indeed legal.
-          This is very inefficient, if the storage was more sophisticated, it could probably the possible to loop through pieces not squares and other stuff,
-          but then again this is Hexapawn and it is plenty efficient enough for it.
+          The legal moves are generated by looping through the pawns of the player to move (the set bits of its bitboard),
+          generating all moves it could probably make and checking if they are indeed legal with the push and capture tables.
+          Moves come out ordered by starting square, pushes before captures, which is the same order the old square by square loop produced.
           Just like with the applymove method it runs the risk of doing illegal things, it assumes we are not in a terminal position and therefore must be used after a terminal check
 
           Including the terminal check into this method i.e. check if it is a terminal position and return an empty list if it is, is largely a function of taste
 
+          The moves are only generated once per position, later calls return the same cached list so it must not be changed by the caller
         """
+        if self.legal_moves is not None:
+            return self.legal_moves
+        geometry = self.geometry
+        if self.turn == self.WHITE:
+            own, opponent = self.white, self.black
+            pushes, captures = geometry.whitePushes, geometry.whiteCaptures
+            pushIndex, captureIndex = geometry.whitePushIndex, geometry.whiteCaptureIndex
+        else:
+            own, opponent = self.black, self.white
+            pushes, captures = geometry.blackPushes, geometry.blackCaptures
+            pushIndex, captureIndex = geometry.blackPushIndex, geometry.blackCaptureIndex
+        occupied = self.white | self.black
+
         move = [] # create empty list to append moves to it as they are created
-        for i in range(9): # for all squares on the board
-            if self.board[i] == self.turn: # if the piece on said square is the piece to play, consider it else move along
-                if self.turn == self.WHITE: # Do this for white
-                    if (i-3) >= 0: # checks if the square in question has a square if front of it i.e. isn't  at the end of the bpoard
-                        if self.board[i-3] == self.EMPTY: # if said square in front is empty...
-                            move.append((i, i-3)) # ...append the pawn push
-                        for capture in self.WHITE_PAWN_CAPTURES[i]: # for potentially possible capture destinations
-                            if self.board[capture] == self.BLACK: # if an enemy pawn is there...
-                                move.append((i, capture)) #...append the pawn capture
-
-                if self.turn == self.BLACK: # essentially symmetrical to white
-                    if (i+3) < 9:
-                        if self.board[i+3] == self.EMPTY:
-                            move.append((i, i+3))
-                        for capture in self.BLACK_PAWN_CAPTURES[i]:
-                            if self.board[capture] == self.WHITE:
-                                move.append((i, capture))
+        indices = [] # and the network output index of each of them alongside
+        while own: # for every pawn of the player to move, lowest square first
+            lowest = own & -own
+            i = lowest.bit_length() - 1
+            own ^= lowest
+            push = pushes[i]
+            if push is not None and not (occupied >> push) & 1: # if the square in front exists and is empty...
+                move.append((i, push)) # ...append the pawn push
+                indices.append(pushIndex[i])
+            for capture, index in zip(captures[i], captureIndex[i]): # for potentially possible capture destinations
+                if (opponent >> capture) & 1: # if an enemy pawn is there...
+                    move.append((i, capture)) #...append the pawn capture
+                    indices.append(index)
 
         self.legal_moves = move
-        return self.legal_moves 
+        self.move_indices = indices
+        return self.legal_moves
+
+    def moveIndices(self):
+        """
+        network output index of every legal move, in the same order as generateMoves. Cached the same way so it must not be changed either
+        """
+        if self.move_indices is None:
+            self.generateMoves()
+        return self.move_indices
 
     def isTerminal(self):
         """
-        returns a tuple containing if the position is Terminal and the winner if it is
+        returns a tuple containing if the position is Terminal and the winner if it is. Only worked out once per position like the legal moves
         """
+        if self.terminal is None:
+            self.terminal = self._terminal()
+        return self.terminal
+
+    def _terminal(self):
         winner = None
-        if (self.board[6] == self.BLACK or
-            self.board[7] == self.BLACK or
-            self.board[8] == self.BLACK): # pawn on the final rank for either player is a terminal position and a win for said player
+        if self.black & self.geometry.blackLastRank: # pawn on the final rank for either player is a terminal position and a win for said player
             winner = self.BLACK
-        if (self.board[0] == self.WHITE or
-            self.board[1] == self.WHITE or
-            self.board[2] == self.WHITE):
+        if self.white & self.geometry.whiteLastRank:
             winner = self.WHITE
-        if winner != None: 
+        if winner != None:
             return (True, winner)
         else:# if no terminal position thus far the only remaining terminal position is one with no moves, and the winner is whoever is not to move
             if len(self.generateMoves()) == 0:
@@ -168,36 +340,22 @@ class Board():
         In the book, the Neural Net was created to play for both sides so additional entries were required to specify whose turn it was.
         My Neural Net is designed to have the position pre transformed so it only ever sees it from the playing player's turn and it doesn't need these additional inputs.
         The book encoded the position by looping through the board and appending a one to the position vector list if the position had a white pawn and a zero if it didn't,
-        essentially a one-hot encoding. The same thing is done for black and appended to the end of the list. 3 more entries are added to the list. 3 ones if it is white to move and 
+        essentially a one-hot encoding. The same thing is done for black and appended to the end of the list. 3 more entries are added to the list. 3 ones if it is white to move and
         three zeros if it isn't. I do not quite understand why 3 bits were used instead of one but my guess is that it spreads the load among multiple inputs and allows it to work
         with smaller weights or a wider variety of weights leading to easier training. A similar wasteful approach was used in the AlphaZero paper that this entire project is inpired by
-        To encode a position, I instead need to show it from the position of the player. To do this i always rotated the position if it was black to play by looping from the end.
-        This removes the requirement for the last 3 bits and reduces the input to 18
+        To encode a position, I instead need to show it from the position of the player. To do this i always rotated the position if it was black to play by reading the bits from the end.
+        This removes the requirement for the last 3 bits and reduces the input to 18 (twice the number of squares on other board sizes).
+        With bitboards the one-hot encoding of each colour is just the bitboard written out, so both halves are looked up in the precomputed tables of the geometry
         """
-        posVec = []
+        geometry = self.geometry
+        if geometry.bits is None: # board too big for lookup tables
+            if self.turn == self.WHITE:
+                return _bitList(self.white, geometry.squares) + _bitList(self.black, geometry.squares)
+            return _bitList(self.black, geometry.squares)[::-1] + _bitList(self.white, geometry.squares)[::-1]
         if self.turn == self.WHITE:
-            for i in range(9):
-                if self.board[i] == self.WHITE:
-                    posVec.append(1)
-                else:
-                    posVec.append(0)
-            for i in range(9):
-                    if self.board[i] == self.BLACK:
-                        posVec.append(1)
-                    else:
-                        posVec.append(0)
+            return geometry.bits[self.white] + geometry.bits[self.black]
         else:
-            for i in range(8, -1, -1): # starting from the end of the board effectively rotates the board
-                if self.board[i] == self.BLACK:
-                    posVec.append(1)
-                else:
-                    posVec.append(0)
-            for i in range(8, -1, -1):
-                if self.board[i] == self.WHITE:
-                    posVec.append(1)
-                else:
-                    posVec.append(0)
-        return posVec   
+            return geometry.bitsRotated[self.black] + geometry.bitsRotated[self.white] # reversing the bits effectively rotates the board
     # Remarks of what to adjust later
 
     # the idea of the Neural Network aiding feature being separated from the Board class to aid modularity
@@ -205,13 +363,8 @@ class Board():
     # repition of code for white then black should be avoidable as this is a symmetric game so the same logic should be useable for both,
     # further more the theme of my approach as opposed to the original code in the book is symmetry so changing it feels natural.
 
-    # quirk of this board class as opposed to many others is that it lacks a board.pop() method to reverse moves so it heavily relies on the copy module to fill the gap
-    # it aids intuitive understanding especially for the minimax and MCTS but its unclear if it sacrifices efficiency. Unsure whether to change it or leave as is
+    # the board now has an undomove method and a cheap copy method so the minimax and MCTS no longer need the copy module to walk the tree
 
     # there is no reverse method for converting output indices to corresponding moves on the board. Might have to change that eventually.
 
-    # the legal_moves instance variable seems to have no real use so it could probably be removed although it could always be checked if it is non-empty in a
-    # position that asked to generate moves before actually running the loop
-
-    # the generatemoves method shouldn't have to loop through the entire  board as it is assumed that it isn't in a terminal position.
-    # The range(9) could be conerveted to a range(6) but this should be done with care however as it requires the symmetery of black and white figured out to really be implemented  
\ No newline at end of file
+    # the legal_moves instance variable is now a real cache, generateMoves returns it instead of running the loop again
@@ -0,0 +1,179 @@
+import multiprocessing
+import os
+import random
+import sys
+import numpy as np
+from Hexapawn import Board
+from engine import Engine
+from numpynet import loadNetwork
+from oracle import OracleTable
+
+# a tournament to compare saved models with each other and with two fixed yardsticks: a player that moves at random and one that plays perfectly.
+# Every pair of players plays the same number of games with each colour. The games of a pairing run side by side on one worker process,
+# so whenever it is a network's turn the positions of all of them go through the network in a single predict call.
+# Players are given as strings: "random", "perfect" or the path of a saved .keras model or of its exported .npz weights
+
+
+class RandomPlayer:
+
+    def chooseMoves(self, boards):
+        return [random.choice(board.generateMoves()) for board in boards]
+
+
+class PerfectPlayer:
+    """
+    plays a move that keeps the perfect play result, going for the quickest win or the longest loss and picking at random between moves that are just as good.
+    Uses the solved game in oracle.npy on the 3x3 board and an Engine search to the end of the game on any other size
+    """
+
+    def __init__(self, width=3, height=3, oraclePath="oracle.npy"):
+        self.oracle = OracleTable(oraclePath) if (width, height) == (3, 3) and os.path.exists(oraclePath) else None
+        self.engine = Engine()
+
+    def chooseMoves(self, boards):
+        if self.oracle is None:
+            return [self.engine.search(board)[1] for board in boards] # the Engine already prefers quicker wins and longer losses
+        return [self.chooseMove(board) for board in boards]
+
+    def chooseMove(self, board):
+        winning = self.oracle.value(board) > 0
+        lengths = {}
+        for move in self.oracle.bestMoves(board):
+            board.applymove(move)
+            lengths[move] = int(self.oracle.lookup(board)["plies"])
+            board.undomove()
+        best = min(lengths.values()) if winning else max(lengths.values())
+        return random.choice([move for move, plies in lengths.items() if plies == best])
+
+
+class NetworkPlayer:
+    """
+    plays the legal move the policy head of the network likes best, just like rand_vs_network
+    """
+
+    def __init__(self, network):
+        self.network = network
+
+    def chooseMoves(self, boards):
+        policies = self.network.predict(np.array([board.toNetworkInput() for board in boards]), verbose=0)[0]
+        moves = []
+        for board, policy in zip(boards, policies):
+            indices = board.moveIndices()
+            moves.append(board.generateMoves()[int(np.argmax(policy[indices]))])
+        return moves
+
+
+_players = {} # the players a worker process has loaded so far, every model is only read once per worker
+
+
+def _player(name, width, height):
+    if name not in _players:
+        if name == "random":
+            _players[name] = RandomPlayer()
+        elif name == "perfect":
+            _players[name] = PerfectPlayer(width, height)
+        else:
+            _players[name] = NetworkPlayer(loadNetwork(name))
+    return _players[name]
+
+
+def playGames(white, black, games, width=3, height=3):
+    """
+    plays games games between the two players, all of them at the same time. Returns how many of them white won, there are no draws in Hexapawn
+    """
+    boards = []
+    for _ in range(games):
+        board = Board(width, height)
+        board.setStartingPosition()
+        boards.append(board)
+    players = {Board.WHITE: white, Board.BLACK: black}
+    playing = boards
+    turn = Board.WHITE # every game starts at the same time so they all have the same player to move
+    while playing:
+        for board, move in zip(playing, players[turn].chooseMoves(playing)):
+            board.applymove(move)
+        playing = [board for board in playing if not board.isTerminal()[0]]
+        turn = Board.BLACK if turn == Board.WHITE else Board.WHITE
+    return sum(board.isTerminal()[1] == Board.WHITE for board in boards)
+
+
+def _playPairing(job):
+    white, black, games, seed, width, height = job
+    random.seed(seed)
+    return white, black, playGames(_player(white, width, height), _player(black, width, height), games, width, height)
+
+
+class Arena:
+    """
+    round robin between the given players on a pool of worker processes started with spawn, like the SelfPlayPool.
+    After play, wins[i][j] holds the games player i won against player j over both colours
+    """
+
+    def __init__(self, players, processes=None, width=3, height=3):
+        self.players = list(players)
+        self.processes = processes
+        self.width = width
+        self.height = height
+        self.wins = np.zeros((len(self.players), len(self.players)), dtype=np.int64)
+
+    def play(self, games=50, seed=0):
+        """
+        every ordered pair of different players plays games games, so each pairing is 2 * games games with both players taking white half the time.
+        Returns the wins matrix
+        """
+        jobs = []
+        for i, white in enumerate(self.players):
+            for j, black in enumerate(self.players):
+                if i != j:
+                    jobs.append((white, black, games, seed * len(self.players) ** 2 + len(jobs), self.width, self.height))
+        index = {name: i for i, name in enumerate(self.players)}
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(self.processes) as pool:
+            for white, black, whiteWins in pool.imap_unordered(_playPairing, jobs):
+                self.wins[index[white], index[black]] += whiteWins
+                self.wins[index[black], index[white]] += games - whiteWins
+        return self.wins
+
+    def scores(self):
+        """
+        fraction of its games each player won
+        """
+        games = self.wins + self.wins.T
+        return self.wins.sum(axis=1) / np.maximum(games.sum(axis=1), 1)
+
+    def elo(self, anchor="random", iterations=1000):
+        """
+        Elo ratings fitted to the results with the Bradley-Terry model, the anchor player is rated 0.
+        Every pairing gets half a win each way on top of the real results, otherwise a player that never lost (like the perfect one) would be rated infinitely high
+        """
+        wins = self.wins + 0.5 * ~np.eye(len(self.players), dtype=np.bool_)
+        games = wins + wins.T
+        strength = np.ones(len(self.players))
+        for _ in range(iterations): # the standard fixed point iteration of the Bradley-Terry maximum likelihood
+            strength = wins.sum(axis=1) / (games / (strength[:, np.newaxis] + strength[np.newaxis, :])).sum(axis=1)
+            strength /= strength.sum()
+        ratings = 400 * np.log10(strength)
+        return ratings - (ratings[self.players.index(anchor)] if anchor in self.players else ratings.min())
+
+    def printTables(self):
+        names = [os.path.splitext(os.path.basename(name))[0] for name in self.players]
+        width = max(len(name) for name in names) + 2
+        print("win rate of the row against the column")
+        print("".ljust(width) + "".join(name.rjust(width) for name in names))
+        games = self.wins + self.wins.T
+        for i, name in enumerate(names):
+            row = ["-" if i == j else f"{self.wins[i, j] / games[i, j]:.2f}" for j in range(len(names))]
+            print(name.ljust(width) + "".join(cell.rjust(width) for cell in row))
+        print()
+        scores = self.scores()
+        elo = self.elo()
+        print("player".ljust(width) + "score".rjust(8) + "elo".rjust(8))
+        for i in np.argsort(-elo):
+            print(names[i].ljust(width) + f"{scores[i]:.2f}".rjust(8) + f"{elo[i]:.0f}".rjust(8))
+
+
+if __name__ == "__main__":
+    # python arena.py model.keras... plays the given models against each other, the random player and the perfect player
+    arena = Arena(["random", "perfect"] + sys.argv[1:])
+    arena.play()
+    arena.printTables()
@@ -0,0 +1,252 @@
+import math
+import random
+import time
+import numpy as np
+from Hexapawn import Board
+from instrument import stats
+from budget import SearchBudget
+
+# the same search as MCTS but without an Edge and a Node object (and a Board) for every child of every expanded position.
+# All the statistics live in preallocated NumPy arrays with a row per node and a column per network output index. A position only has a handful of
+# legal moves, so picking a child only looks at the columns of those and backing up is a loop over the (node, index) pairs recorded on the way down.
+# Both read and write single entries through memoryviews of the arrays, a whole-row NumPy call costs more than the few entries that matter.
+# Nodes don't keep a board either, the search plays the moves on one board on the way down and takes them back on the way up
+
+
+class ArrayTree:
+    """
+    the node storage. Node i has its edge statistics in row i of N, W, Q and P, one column per network output index, and the id of the child reached
+    by every move in children (-1 while that child hasn't been reached yet). legal[i] lists the output indices of its legal moves once it is expanded,
+    the other columns are never looked at. n, w, q, p and child are memoryviews of the arrays for reading and writing single entries.
+    The arrays start with room for capacity nodes and double whenever they run out
+    """
+
+    ARRAYS = ("N", "W", "Q", "P", "children", "expanded", "terminal", "terminalValue")
+
+    def __init__(self, policySize, capacity=1024):
+        self.policySize = policySize
+        self.size = 0
+        self.capacity = 0
+        self.allocate(capacity)
+
+    def allocate(self, capacity):
+        """
+        (re)allocates the arrays with room for capacity nodes, keeping the nodes already there
+        """
+        old = {name: getattr(self, name) for name in self.ARRAYS} if self.capacity else {}
+        self.legal = (self.legal if self.capacity else []) + [None] * (capacity - self.capacity)
+        self.capacity = capacity
+        self.N = np.zeros((capacity, self.policySize), dtype=np.float32) # a float so the PUCT needs no conversions, exact up to 2**24 visits
+        self.W = np.zeros((capacity, self.policySize), dtype=np.float32)
+        self.Q = np.zeros((capacity, self.policySize), dtype=np.float32)
+        self.P = np.zeros((capacity, self.policySize), dtype=np.float32)
+        self.children = np.full((capacity, self.policySize), -1, dtype=np.int32)
+        self.expanded = np.zeros(capacity, dtype=np.bool_)
+        self.terminal = np.zeros(capacity, dtype=np.bool_)
+        self.terminalValue = np.zeros(capacity, dtype=np.float32) # value of a terminal node for the player who moved into it
+        for name, array in old.items():
+            getattr(self, name)[:self.size] = array[:self.size]
+        self.n = memoryview(self.N) # n[node, index] is a plain float, much quicker than indexing the array itself
+        self.w = memoryview(self.W)
+        self.q = memoryview(self.Q)
+        self.p = memoryview(self.P)
+        self.child = memoryview(self.children)
+
+    def newNode(self):
+        if self.size == self.capacity:
+            self.allocate(2 * self.capacity)
+        node = self.size
+        self.size += 1
+        self.N[node] = 0
+        self.W[node] = 0
+        self.Q[node] = 0
+        self.P[node] = 0
+        self.children[node] = -1
+        self.legal[node] = None
+        self.expanded[node] = False
+        self.terminal[node] = False
+        return node
+
+    def clear(self):
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+
+class ArrayMCTS:
+    """
+    MCTS on an ArrayTree. Gives the same results as MCTS.search, the (move, probability, N, Q) of every root move, but takes the position as a Board
+    instead of a Node. The tree carries over from one search to the next when advance is called with the move played in between,
+    any other position starts a new tree
+    """
+
+    def __init__(self, network, width=3, height=3, capacity=1024, c_puct=1, tau=1):
+        self.network = network
+        self.width = width
+        self.height = height
+        self.tree = ArrayTree(Board(width, height).policySize, capacity)
+        self.root = None
+        self.rootKey = None
+        self.rootN = 1 # N of the edge leading to the root, same reason the rootEdge of MCTS starts with a N of 1
+        self.c_puct = c_puct
+        self.tau = tau
+        geometry = Board(width, height).geometry
+        last = geometry.squares - 1
+        self.moves = {Board.WHITE: geometry.outputMoves, # the move of every output index for each player, black moves are the rotated white ones
+                      Board.BLACK: [(last - start, last - end) for (start, end) in geometry.outputMoves]}
+
+    def clear(self):
+        self.tree.clear()
+        self.root = None
+        self.rootKey = None
+        self.rootN = 1
+
+    def select(self, node, parentN):
+        """
+        output index of the legal move with the highest PUCT value, picking at random between equally good ones
+        """
+        tree = self.tree
+        N, Q, P = tree.n, tree.q, tree.p
+        scale = self.c_puct * math.sqrt(parentN)
+        best = []
+        bestValue = -math.inf
+        for index in tree.legal[node]:
+            value = Q[node, index] + P[node, index] * scale / (N[node, index] + 1)
+            if value > bestValue:
+                bestValue = value
+                best = [index]
+            elif value == bestValue:
+                best.append(index)
+        return best[0] if len(best) == 1 else random.choice(best)
+
+    def expand(self, node, board):
+        """
+        evaluates the position with the network and fills in the priors of its legal moves. Returns the network evaluation for the player to move
+        """
+        start = time.perf_counter() if stats.enabled else 0
+        q = self.network.predict(np.array([board.toNetworkInput()]))
+        if stats.enabled:
+            stats.addTime("inference", time.perf_counter() - start)
+            stats.count("inferenceCalls")
+            stats.count("inferencePositions")
+        legal = board.moveIndices()
+        tree = self.tree
+        tree.legal[node] = legal # the cached list of the board, it is never changed in place so it can be kept
+        tree.P[node, legal] = q[0][0][legal] / q[0][0][legal].sum() # scale up the probabilities of legal moves after removing illegal moves
+        tree.expanded[node] = True
+        return float(q[1][0][0])
+
+    def evaluate(self, node, board):
+        """
+        value of a leaf for the player who moved into it, from the terminal result or the network
+        """
+        tree = self.tree
+        if tree.terminal[node]:
+            return float(tree.terminalValue[node])
+        terminal, winner = board.isTerminal()
+        if terminal:
+            tree.terminal[node] = True
+            tree.terminalValue[node] = -1 if winner == board.turn else 1
+            return float(tree.terminalValue[node])
+        return - self.expand(node, board)
+
+    def backpropagate(self, v, nodes, indices):
+        """
+        updates every edge on the recorded path, given as the lists of its nodes and output indices, from the leaf back up to the root.
+        The sign of the value flips at every step up
+        """
+        tree = self.tree
+        N, W, Q = tree.n, tree.w, tree.q
+        for node, index in zip(reversed(nodes), reversed(indices)):
+            n = N[node, index] + 1
+            w = W[node, index] + v
+            N[node, index] = n
+            W[node, index] = w
+            Q[node, index] = w / n
+            v = -v
+        self.rootN += 1
+
+    def search(self, board, budget=None):
+        """
+        searches the position on board for as long as the SearchBudget allows, 100 simulations by default,
+        and returns the (move, probability, N, Q) of every move just like MCTS.search
+        """
+        if budget is None:
+            budget = SearchBudget()
+        searchStart = time.perf_counter() if stats.enabled else 0
+        tree = self.tree
+        key = board.key()
+        if self.root is None or key != self.rootKey:
+            self.clear()
+            self.root = tree.newNode()
+            self.rootKey = key
+        if not tree.expanded[self.root] and not board.isTerminal()[0] and len(board.generateMoves()) == 1: # a forced move, answered without the network
+            if stats.enabled:
+                stats.recordSearch(searchStart, 0)
+            return [(board.generateMoves()[0], 1, 0, 0)]
+        board = board.copy() # the search plays its moves on a copy so the board it was given doesn't change
+        if not tree.expanded[self.root] and not board.isTerminal()[0]:
+            self.expand(self.root, board)
+
+        simulations = 0
+        forced = tree.expanded[self.root] and len(tree.legal[self.root]) <= 1 # a single legal move needs no search
+        budget.start()
+        while not forced and not budget.done(simulations, lambda: tree.N[self.root]):
+            simulations += 1
+            start = time.perf_counter() if stats.enabled else 0
+            node = self.root
+            parentN = self.rootN
+            nodes = []
+            indices = []
+            while tree.expanded[node]:
+                index = self.select(node, parentN)
+                nodes.append(node)
+                indices.append(index)
+                parentN = tree.n[node, index]
+                board.applymove(self.moves[board.turn][index])
+                child = tree.child[node, index]
+                if child < 0: # first visit, the child gets its node now
+                    child = tree.newNode()
+                    tree.child[node, index] = child # newNode may have reallocated, so the view is looked up again
+                    if stats.enabled:
+                        stats.count("nodesCreated")
+                node = child
+            if stats.enabled:
+                stats.addTime("select", time.perf_counter() - start)
+            v = self.evaluate(node, board)
+            start = time.perf_counter() if stats.enabled else 0
+            self.backpropagate(v, nodes, indices)
+            for _ in nodes:
+                board.undomove()
+            if stats.enabled:
+                stats.addTime("backpropagate", time.perf_counter() - start)
+        if stats.enabled:
+            stats.recordSearch(searchStart, simulations)
+        return self.moveProbabilities(board)
+
+    def advance(self, board, move):
+        """
+        makes the child reached by move from the position on board the new root, keeping its statistics for the next search.
+        The rest of the old tree stays in the arrays until the next clear
+        """
+        index = board.getNetworkOutputIndex(move)
+        child = self.tree.children[self.root, index]
+        if child < 0:
+            self.clear()
+            return
+        self.rootN = max(int(self.tree.N[self.root, index]), 1)
+        self.root = child
+        board = board.copy()
+        board.applymove(move)
+        self.rootKey = board.key()
+
+    def moveProbabilities(self, board):
+        moves = board.generateMoves()
+        indices = board.moveIndices()
+        counts = self.tree.N[self.root, indices].astype(np.float64) ** (1/self.tau) # float32 probabilities can add up to a bit over 1, which np.random.multinomial refuses
+        total = counts.sum()
+        if total == 0: # a forced move that wasn't searched
+            counts = np.ones(len(moves))
+            total = len(moves)
+        return [(move, float(counts[i] / total), int(self.tree.N[self.root, index]), float(self.tree.Q[self.root, index])) for i, (move, index) in enumerate(zip(moves, indices))]
@@ -0,0 +1,72 @@
+import numpy as np
+from Hexapawn import Board, Geometry
+
+# the Board methods work on one position at a time with Python loops, which is fine inside a search but slow when building whole datasets.
+# These functions do the same for a whole array of positions at once with NumPy.
+# Positions are given as an (N, squares) array using the Board.EMPTY, Board.WHITE and Board.BLACK codes (the same as Board.board), and turns as an (N,) array of
+# Board.WHITE or Board.BLACK. Just like toNetworkInput, positions with black to move are rotated so everything is seen from the point of view of the player to move
+
+
+_moveTables = {} # (width, height) -> (start squares, destination squares, is capture) of every policy index
+
+
+def _moves(width, height):
+    if (width, height) not in _moveTables:
+        moves = Geometry.get(width, height).outputMoves
+        starts = np.array([move[0] for move in moves])
+        ends = np.array([move[1] for move in moves])
+        _moveTables[(width, height)] = (starts, ends, (starts - ends) != width) # only pushes go straight up a whole row
+    return _moveTables[(width, height)]
+
+
+def fromBoards(boards):
+    """
+    stacks a list of boards into the positions and turns arrays the other functions take
+    """
+    return np.array([board.board for board in boards], dtype=np.int8), np.array([board.turn for board in boards], dtype=np.int8)
+
+
+def _perspective(positions, turns):
+    """
+    splits the positions into the pawns of the player to move and of the opponent, rotating the rows where black is to move
+    """
+    positions = np.asarray(positions)
+    turns = np.asarray(turns)[:, np.newaxis]
+    own = (positions == turns)
+    opponent = (positions != Board.EMPTY) & ~own
+    rotate = turns == Board.BLACK
+    own = np.where(rotate, own[:, ::-1], own)
+    opponent = np.where(rotate, opponent[:, ::-1], opponent)
+    return own, opponent
+
+
+def networkInputs(positions, turns):
+    """
+    the (N, 2 * squares) network inputs, row i equal to toNetworkInput of position i
+    """
+    own, opponent = _perspective(positions, turns)
+    return np.concatenate([own, opponent], axis=1).astype(np.int8)
+
+
+def legalMoveMasks(positions, turns, width=3, height=3):
+    """
+    (N, policySize) boolean array, True where the move with that network output index is legal. Like generateMoves it doesn't check for terminal positions
+    """
+    own, opponent = _perspective(positions, turns)
+    starts, ends, captures = _moves(width, height)
+    empty = ~(own | opponent)
+    return own[:, starts] & np.where(captures, opponent[:, ends], empty[:, ends])
+
+
+def terminalStatus(positions, turns, width=3, height=3):
+    """
+    the same as isTerminal for every position: returns an (N,) boolean array of terminal flags and an (N,) array of winners, Board.EMPTY where there is none yet
+    """
+    positions = np.asarray(positions)
+    turns = np.asarray(turns)
+    whiteWins = (positions[:, :width] == Board.WHITE).any(axis=1) # pawn on the final rank
+    blackWins = (positions[:, -width:] == Board.BLACK).any(axis=1)
+    stuck = ~legalMoveMasks(positions, turns, width, height).any(axis=1) # no moves, the player not to move wins
+    opponent = np.where(turns == Board.WHITE, Board.BLACK, Board.WHITE)
+    winner = np.where(whiteWins, Board.WHITE, np.where(blackWins, Board.BLACK, np.where(stuck, opponent, Board.EMPTY))).astype(np.int8)
+    return winner != Board.EMPTY, winner
@@ -0,0 +1,358 @@
+import sys
+import json
+import time
+import random
+import platform
+import statistics
+import subprocess
+import numpy as np
+from Hexapawn import Board
+from mcts import MCTS, Edge, Node, ReinfLearn
+from arraymcts import ArrayMCTS
+from inference import InferenceServer
+from selfplay import playGamesConcurrently
+from numpynet import NumpyNetwork
+from minimax import minimax
+from engine import Engine
+from oracle import solve
+import batchboard
+
+# quick benchmarks to see how fast the search actually is. They don't check playing strength at all, only speed.
+# runSuite measures a fixed set of numbers with fixed seeds and writes them to a JSON file, so the results of different commits can be compared.
+# The other benchmark functions are one-off comparisons that only print
+
+
+class UniformNetwork:
+    """
+    stand in for the Keras model when TensorFlow isn't around. Gives every move the same probability and every position an evaluation of 0,
+    so it measures the cost of the search itself without any network
+    """
+    def __init__(self, policySize=14):
+        self.policySize = policySize
+
+    def predict(self, x, verbose=0):
+        return [np.full((len(x), self.policySize), 1/self.policySize), np.zeros((len(x), 1))]
+
+
+def loadKerasModel(path):
+    """
+    the Keras model saved at path, or None if TensorFlow isn't installed. Unlike numpynet.loadNetwork it never falls back to the NumPy forward pass,
+    the benchmarks time that one separately
+    """
+    try:
+        from tensorflow import keras
+    except ImportError:
+        return None
+    return keras.models.load_model(path)
+
+
+def newRoot(width=3, height=3):
+    board = Board(width, height)
+    board.setStartingPosition()
+    rootEdge = Edge(None, None)
+    rootEdge.N = 1 # same as in ReinfLearn.playGame
+    return Node(board, rootEdge)
+
+
+def simulationsPerSecond(search, repeats, width=3, height=3):
+    """
+    runs a search from the starting position a number of times and returns the average simulations per second. Every search is 100 simulations
+    """
+    start = time.perf_counter()
+    for _ in range(repeats):
+        search(newRoot(width, height))
+    return 100 * repeats / (time.perf_counter() - start)
+
+
+def benchmarkBatchedSearch(network, batchSizes=(1, 4, 8, 16, 32), repeats=5):
+    """
+    compares MCTS.search against MCTS.batchedSearch at several batch sizes
+    """
+    random.seed(0)
+    mcts = MCTS(network)
+    baseline = simulationsPerSecond(mcts.search, repeats)
+    print(f"MCTS.search: {baseline:.1f} simulations/second")
+    for batchSize in batchSizes:
+        rate = simulationsPerSecond(lambda root: mcts.batchedSearch(root, batchSize), repeats)
+        print(f"MCTS.batchedSearch batchSize={batchSize}: {rate:.1f} simulations/second ({rate/baseline:.2f}x)")
+
+
+def benchmarkInferenceServer(network, games=32, threads=(1, 8, 32)):
+    """
+    plays self-play games on threads sharing an InferenceServer and reports games per second together with the server's batching statistics
+    """
+    for threadCount in threads:
+        random.seed(0)
+        np.random.seed(0)
+        with InferenceServer(network) as server:
+            start = time.perf_counter()
+            for _ in playGamesConcurrently(server, games, threadCount):
+                pass
+            elapsed = time.perf_counter() - start
+            stats = server.stats()
+        print(f"InferenceServer threads={threadCount}: {games/elapsed:.2f} games/second, "
+              f"mean batch {stats['meanBatchSize']:.1f} ({100*stats['meanBatchFill']:.0f}% full), mean latency {1000*stats['meanLatency']:.2f}ms")
+
+
+def benchmarkInferenceLatency(path, batchSizes=(1, 16, 256), repeats=200):
+    """
+    average time of a single predict call of the NumpyNetwork and, if TensorFlow is installed, of the Keras model at several batch sizes
+    """
+    networks = {"NumpyNetwork": NumpyNetwork.fromKeras(path)}
+    keras = loadKerasModel(path)
+    if keras is not None:
+        networks["Keras"] = keras
+    rng = np.random.default_rng(0)
+    for batchSize in batchSizes:
+        x = rng.integers(0, 2, (batchSize, 18)).astype(np.float32)
+        for name, network in networks.items():
+            network.predict(x, verbose=0) # warm up, Keras builds its predict function on the first call
+            start = time.perf_counter()
+            for _ in range(repeats):
+                network.predict(x, verbose=0)
+            latency = (time.perf_counter() - start) / repeats
+            print(f"{name} batch={batchSize}: {1e6*latency:.1f}us per call")
+
+
+class CountingBoard(Board):
+    """
+    Board that counts the moves played on it, minimax walks the whole tree on a single board so that is its node count minus the root
+    """
+    def __init__(self):
+        super().__init__()
+        self.moves = 0
+
+    def applymove(self, move):
+        self.moves += 1
+        super().applymove(move)
+
+
+def benchmarkEngine(repeats=20):
+    """
+    nodes visited and time taken to find the value of the starting position by minimax.minimax and by the alpha-beta Engine
+    """
+    start = time.perf_counter()
+    for _ in range(repeats):
+        board = CountingBoard()
+        board.setStartingPosition()
+        minimax(board, [], [], [])
+    elapsed = (time.perf_counter() - start) / repeats
+    print(f"minimax.minimax: {board.moves + 1} nodes, {1000*elapsed:.2f}ms")
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        board = Board()
+        board.setStartingPosition()
+        engine = Engine() # a new engine every time so the transposition table starts empty
+        engine.search(board)
+    elapsed = (time.perf_counter() - start) / repeats
+    print(f"Engine.search: {engine.nodes} nodes, {1000*elapsed:.2f}ms")
+
+
+def benchmarkBoardSizes(sizes=((3, 3), (3, 4), (4, 4), (5, 5)), minimaxSquares=12):
+    """
+    how the searches cope with bigger boards: full minimax (only up to minimaxSquares squares, it already takes tens of seconds on 4x4),
+    the memoized solve of the oracle (not on 5x5 which has too many positions), the alpha-beta Engine and MCTS with the uniform network
+    """
+    for (width, height) in sizes:
+        board = Board(width, height)
+        board.setStartingPosition()
+        squares = width * height
+        if squares <= minimaxSquares:
+            start = time.perf_counter()
+            minimax(board, [], [], [])
+            print(f"{width}x{height} minimax.minimax: {time.perf_counter() - start:.3f}s")
+        if squares < 25:
+            start = time.perf_counter()
+            positions = len(solve(board))
+            print(f"{width}x{height} oracle.solve: {positions} positions in {time.perf_counter() - start:.3f}s")
+        engine = Engine()
+        start = time.perf_counter()
+        engine.search(board, timeLimit=10)
+        print(f"{width}x{height} Engine.search: {engine.nodes} nodes, depth {engine.depth} in {time.perf_counter() - start:.3f}s")
+        random.seed(0)
+        mcts = MCTS(UniformNetwork(board.policySize))
+        rate = simulationsPerSecond(mcts.search, 5, width, height)
+        print(f"{width}x{height} MCTS.search: {rate:.1f} simulations/second")
+
+
+def reachableBoards(width=3, height=3):
+    """
+    a board for every position reachable from the start, in the order of their keys
+    """
+    board = Board(width, height)
+    board.setStartingPosition()
+    boards = []
+    squares = width * height
+    for key in sorted(solve(board)): # rebuild a board from every key of the solved game
+        position = Board(width, height)
+        position.white = key & ((1 << squares) - 1)
+        position.black = (key >> squares) & ((1 << squares) - 1)
+        position.turn = Board.BLACK if key >> (2 * squares) else Board.WHITE
+        boards.append(position)
+    return boards
+
+
+def benchmarkBatchEncoding(width=4, height=4):
+    """
+    encodes, generates moves for and checks every reachable position of a board one Board at a time and then with the batchboard functions
+    """
+    boards = reachableBoards(width, height)
+
+    start = time.perf_counter()
+    for position in boards:
+        position.toNetworkInput()
+        position.isTerminal()
+        position.generateMoves()
+    elapsed = time.perf_counter() - start
+    print(f"{width}x{height} Board methods: {len(boards)} positions in {1000*elapsed:.1f}ms")
+
+    positions, turns = batchboard.fromBoards(boards)
+    start = time.perf_counter()
+    batchboard.networkInputs(positions, turns)
+    batchboard.terminalStatus(positions, turns, width, height)
+    batchboard.legalMoveMasks(positions, turns, width, height)
+    elapsed = time.perf_counter() - start
+    print(f"{width}x{height} batchboard: {len(boards)} positions in {1000*elapsed:.1f}ms")
+
+
+def timeRounds(function, rounds, number=1):
+    """
+    calls function number times in each of rounds rounds and returns the median over the rounds of the wall time of one call,
+    the median is much less bothered by the odd slow round than the mean
+    """
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        times.append((time.perf_counter() - start) / number)
+    return statistics.median(times)
+
+
+def seed(value):
+    random.seed(value)
+    np.random.seed(value)
+
+
+def gitCommit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def runSuite(path="supervised_model.keras", rounds=5, randomSeed=0):
+    """
+    the fixed set of benchmarks whose results get compared between commits. Every measurement reseeds random and np.random with randomSeed first
+    so they don't depend on each other or on their order, and every timing is the median of rounds rounds.
+    Returns a dict with the machine the suite ran on and one entry per measurement, either {"value": ..., "unit": ...} or {"skipped": reason}
+    when it needs something that isn't installed
+    """
+    results = {}
+    keras = loadKerasModel(path)
+    networks = {"uniform": UniformNetwork(), "numpy": NumpyNetwork.fromKeras(path), "keras": keras}
+
+    def record(name, value, unit):
+        results[name] = {"value": value, "unit": unit}
+        print(f"{name}: {value:.6g} {unit}")
+
+    def skip(name, reason):
+        results[name] = {"skipped": reason}
+        print(f"{name}: skipped, {reason}")
+
+    boards = reachableBoards()
+    moveCount = sum(len(board.generateMoves()) for board in boards)
+    seed(randomSeed)
+    def generateAll():
+        for board in boards:
+            board.clearCache() # otherwise only the first round would generate anything
+            board.generateMoves()
+    elapsed = timeRounds(generateAll, rounds, 100)
+    record("board.generateMoves", moveCount / elapsed, "moves/second")
+
+    def applyAll():
+        for board in boards:
+            for move in board.generateMoves():
+                board.applymove(move)
+                board.undomove()
+    seed(randomSeed)
+    record("board.applymove", moveCount / timeRounds(applyAll, rounds, 100), "moves/second") # every applymove comes with an undomove
+
+    def solveStart():
+        board = Board()
+        board.setStartingPosition()
+        minimax(board, [], [], [])
+    seed(randomSeed)
+    record("minimax.minimax", timeRounds(solveStart, rounds, 100), "seconds")
+
+    for name, network in networks.items():
+        if network is None:
+            skip(f"mcts.search.{name}", "TensorFlow not installed")
+            skip(f"arraymcts.search.{name}", "TensorFlow not installed")
+            continue
+        mcts = MCTS(network)
+        seed(randomSeed)
+        record(f"mcts.search.{name}", 100 / timeRounds(lambda: mcts.search(newRoot()), rounds, 10), "simulations/second")
+        arrayMcts = ArrayMCTS(network)
+        board = Board()
+        board.setStartingPosition()
+        def arraySearch():
+            arrayMcts.clear() # a new tree every time, like the new root of MCTS.search
+            arrayMcts.search(board)
+        seed(randomSeed)
+        record(f"arraymcts.search.{name}", 100 / timeRounds(arraySearch, rounds, 10), "simulations/second")
+
+    for name in ("numpy", "keras"):
+        if networks[name] is None:
+            skip(f"reinflearn.playGame.{name}", "TensorFlow not installed")
+            continue
+        learner = ReinfLearn(networks[name])
+        seed(randomSeed)
+        record(f"reinflearn.playGame.{name}", 60 / timeRounds(learner.playGame, rounds, 5), "games/minute")
+
+    rng = np.random.default_rng(randomSeed)
+    for batchSize in (1, 16, 64, 256):
+        x = rng.integers(0, 2, (batchSize, 18)).astype(np.float32)
+        for name in ("numpy", "keras"):
+            network = networks[name]
+            if network is None:
+                skip(f"inference.{name}.batch{batchSize}", "TensorFlow not installed")
+                continue
+            network.predict(x, verbose=0) # warm up, Keras builds its predict function on the first call
+            record(f"inference.{name}.batch{batchSize}", 1e6 * timeRounds(lambda: network.predict(x, verbose=0), rounds, 100), "us/call")
+
+    return {
+        "commit": gitCommit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "model": path,
+        "rounds": rounds,
+        "seed": randomSeed,
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    # python benchmark.py [model path] [results path] runs the suite and writes its results, add --all to also run the one-off comparisons
+    args = [arg for arg in sys.argv[1:] if arg != "--all"]
+    path = args[0] if len(args) > 0 else "supervised_model.keras"
+    output = args[1] if len(args) > 1 else "benchmark.json"
+    suite = runSuite(path)
+    with open(output, "w") as f:
+        json.dump(suite, f, indent=2)
+    print(f"results written to {output}")
+
+    if "--all" in sys.argv:
+        network = loadKerasModel(path)
+        if network is None:
+            print("TensorFlow not found, using the uniform network instead")
+            network = UniformNetwork()
+        benchmarkBatchedSearch(network)
+        benchmarkInferenceServer(network)
+        benchmarkInferenceLatency(path)
+        benchmarkEngine()
+        benchmarkBoardSizes()
+        benchmarkBatchEncoding()
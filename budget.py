@@ -0,0 +1,49 @@
+import time
+
+# how long a search gets to think. A fixed number of simulations is the simplest, a time limit is what matters when playing live,
+# and either way simulations are wasted once the move that will be played is already certain
+
+
+class SearchBudget:
+    """
+    stopping rule shared by MCTS.search, MCTS.batchedSearch and ArrayMCTS.search. simulations is the most simulations a search runs and timeLimit the
+    most seconds it takes, like the timeLimit of Engine.search. Either of them can be None but not both.
+    With earlyStop the search also ends as soon as the most visited root move can't be overtaken any more with the simulations that are left,
+    so it needs simulations. The searches don't spend anything on a position with a single legal move, not even a network call, whatever the budget
+    """
+
+    def __init__(self, simulations=100, timeLimit=None, earlyStop=False):
+        if simulations is None and timeLimit is None:
+            raise ValueError("a search budget needs a number of simulations, a time limit or both")
+        if earlyStop and simulations is None:
+            raise ValueError("earlyStop needs a number of simulations to tell when the best move can't be overtaken")
+        self.simulations = simulations
+        self.timeLimit = timeLimit
+        self.earlyStop = earlyStop
+        self.deadline = None
+
+    def start(self):
+        """
+        starts the clock of the time limit, called by the search before its first simulation
+        """
+        self.deadline = time.perf_counter() + self.timeLimit if self.timeLimit is not None else None
+
+    def remaining(self, simulations):
+        """
+        how many more simulations can be run after simulations of them, None if only the time limit counts
+        """
+        return None if self.simulations is None else self.simulations - simulations
+
+    def done(self, simulations, rootCounts):
+        """
+        True once the search should stop after simulations simulations. rootCounts is a function returning the visit counts of the root moves,
+        it is only called with earlyStop
+        """
+        if self.simulations is not None and simulations >= self.simulations:
+            return True
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            return True
+        if self.earlyStop:
+            counts = sorted(rootCounts())
+            return len(counts) > 1 and counts[-1] - counts[-2] > self.simulations - simulations
+        return False
@@ -0,0 +1,298 @@
+import io
+import multiprocessing
+import os
+import queue
+import socket
+import stat
+import struct
+import sys
+import threading
+import time
+import numpy as np
+from budget import SearchBudget
+from mcts import ReinfLearn
+from numpynet import NumpyNetwork, loadNetwork
+from symmetry import SymmetricNetwork
+
+# self-play spread over several machines. A coordinator listens on a TCP port (or a Unix socket when the address is a path) and worker processes,
+# local or on other machines, connect to it. The coordinator hands out one game at a time to every worker together with the generation of the weights
+# to play it with, and sends the weights themselves first whenever a worker doesn't have that generation yet. Workers send back the positions,
+# policy vectors and values of the game in a compact binary form. If a worker disconnects or takes too long its game goes back in the queue for another one.
+#
+# Every message is a frame: a 1 byte message type and a 4 byte payload length, both big-endian, followed by the payload
+#     WEIGHTS  coordinator -> worker: generation (uint32), width and height (uint8 each), then the weights as an .npz file (NumpyNetwork.save)
+#     JOB      coordinator -> worker: job id (uint64), generation (uint32), simulations per move (uint32, 0 for the default budget)
+#     RESULT   worker -> coordinator: job id (uint64), generation (uint32), positions, input size and policy size (uint32 each), then the network inputs
+#              as packed bits (one row of bytes per position), the move probabilities as float32 and the values as int8
+#     STOP     coordinator -> worker: no payload, the worker exits
+
+WEIGHTS = 1
+JOB = 2
+RESULT = 3
+STOP = 4
+
+HEADER = struct.Struct("!BI")
+WEIGHTS_HEADER = struct.Struct("!IBB")
+JOB_MESSAGE = struct.Struct("!QII")
+RESULT_HEADER = struct.Struct("!QIIII")
+
+
+def _socket(address):
+    return socket.socket(socket.AF_UNIX if isinstance(address, str) else socket.AF_INET, socket.SOCK_STREAM)
+
+
+def _receive(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        data += chunk
+    return bytes(data)
+
+
+def sendFrame(sock, kind, payload=b""):
+    sock.sendall(HEADER.pack(kind, len(payload)) + payload)
+
+
+def receiveFrame(sock):
+    """
+    the (message type, payload) of the next frame, raises ConnectionError if the other side has gone
+    """
+    kind, length = HEADER.unpack(_receive(sock, HEADER.size))
+    return kind, _receive(sock, length)
+
+
+def encodeGame(jobId, generation, positionData, moveProbData, valueData):
+    """
+    payload of a RESULT message for the data of a game as returned by ReinfLearn.playGame
+    """
+    inputs = np.asarray(positionData, dtype=np.uint8)
+    moveProbs = np.asarray(moveProbData, dtype=np.float32)
+    header = RESULT_HEADER.pack(jobId, generation, len(inputs), inputs.shape[1], moveProbs.shape[1])
+    return header + np.packbits(inputs, axis=1).tobytes() + moveProbs.astype(">f4").tobytes() + np.asarray(valueData, dtype=np.int8).tobytes()
+
+
+def decodeGame(payload):
+    """
+    the other way round, returns the job id, the generation and the (positionData, moveProbData, valueData) lists just like playGame gives them
+    """
+    jobId, generation, positions, inputSize, policySize = RESULT_HEADER.unpack_from(payload)
+    offset = RESULT_HEADER.size
+    rowBytes = -(-inputSize // 8)
+    packed = np.frombuffer(payload, np.uint8, positions * rowBytes, offset).reshape(positions, rowBytes)
+    offset += positions * rowBytes
+    moveProbs = np.frombuffer(payload, ">f4", positions * policySize, offset).reshape(positions, policySize)
+    offset += 4 * positions * policySize
+    values = np.frombuffer(payload, np.int8, positions, offset)
+    inputs = np.unpackbits(packed, axis=1, count=inputSize)
+    return jobId, generation, (inputs.astype(int).tolist(), moveProbs.astype(np.float64).tolist(), values.astype(int).tolist())
+
+
+class Coordinator:
+    """
+    hands out self-play games to the workers connected at address, ("host", port) for TCP or a path for a Unix socket. Port 0 picks a free port,
+    the one actually used is in self.address once started. network is the NumpyNetwork the games are played with until publish gives a new one.
+    A worker that doesn't answer within jobTimeout seconds, or sends back something that can't be read, is dropped and its game given to another worker
+    """
+
+    def __init__(self, network, address=("127.0.0.1", 0), width=3, height=3, simulations=0, jobTimeout=60):
+        self.width = width
+        self.height = height
+        self.simulations = simulations
+        self.jobTimeout = jobTimeout
+        self.published = (-1, None) # (generation, WEIGHTS payload) of the newest weights, replaced as a whole so both are always read together
+        self.publish(network)
+        self.jobs = queue.Queue() # ids of the games still to be handed out
+        self.results = queue.Queue() # (generation, game data) of the finished ones
+        self.nextJob = 0
+        self.lock = threading.Lock() # guards the counts below, they are changed by every serving thread
+        self.workers = 0 # workers connected right now
+        self.retries = 0 # games that had to be handed out again
+        self.stopping = threading.Event()
+        self.path = address if isinstance(address, str) else None
+        if self.path is not None and os.path.exists(self.path):
+            self.removeStaleSocket()
+        self.server = _socket(address)
+        if self.path is None:
+            self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(address)
+        self.server.listen()
+        self.address = self.server.getsockname()
+        self.acceptor = threading.Thread(target=self.accept, daemon=True)
+        self.acceptor.start()
+
+    def removeStaleSocket(self):
+        """
+        deletes the socket file a coordinator that didn't close left at self.path, binding fails while it is there.
+        Raises instead if the path isn't a socket or a coordinator is still listening on it
+        """
+        if not stat.S_ISSOCK(os.stat(self.path).st_mode):
+            raise FileExistsError(f"{self.path} exists and isn't a socket")
+        probe = _socket(self.path)
+        try:
+            probe.connect(self.path)
+        except OSError: # nothing listening, the file is stale
+            os.unlink(self.path)
+            return
+        finally:
+            probe.close()
+        raise OSError(f"a coordinator is already listening on {self.path}")
+
+    def publish(self, network):
+        """
+        makes network the one new games are played with, under the next generation number. Games already handed out finish with the old one
+        """
+        buffer = io.BytesIO()
+        network.save(buffer)
+        generation = self.published[0] + 1
+        self.published = (generation, WEIGHTS_HEADER.pack(generation, self.width, self.height) + buffer.getvalue())
+
+    @property
+    def generation(self):
+        return self.published[0]
+
+    def accept(self):
+        while not self.stopping.is_set():
+            try:
+                connection, _ = self.server.accept()
+            except OSError: # the server socket was closed
+                return
+            threading.Thread(target=self.serve, args=(connection,), daemon=True).start()
+
+    def serve(self, connection):
+        """
+        runs one thread per connected worker, giving it a game at a time until the coordinator closes or the worker goes away
+        """
+        workerGeneration = None
+        connection.settimeout(self.jobTimeout)
+        with self.lock:
+            self.workers += 1
+        try:
+            with connection:
+                while not self.stopping.is_set():
+                    try:
+                        jobId = self.jobs.get(timeout=0.1)
+                    except queue.Empty:
+                        continue
+                    try:
+                        generation, weights = self.published # a single read, so the weights sent always match the generation of the job
+                        if workerGeneration != generation:
+                            sendFrame(connection, WEIGHTS, weights)
+                            workerGeneration = generation
+                        sendFrame(connection, JOB, JOB_MESSAGE.pack(jobId, generation, self.simulations))
+                        kind, payload = receiveFrame(connection)
+                        if kind != RESULT:
+                            raise ConnectionError(f"unexpected message {kind} from a worker")
+                        resultId, resultGeneration, data = decodeGame(payload)
+                        if resultId != jobId:
+                            raise ValueError(f"result of job {resultId} sent for job {jobId}")
+                    except Exception: # the worker is gone or sent garbage, either way it is dropped and someone else plays the game
+                        self.jobs.put(jobId)
+                        with self.lock:
+                            self.retries += 1
+                        return
+                    self.results.put((resultGeneration, data))
+                try:
+                    sendFrame(connection, STOP)
+                except OSError:
+                    pass
+        finally:
+            with self.lock:
+                self.workers -= 1
+
+    def playGames(self, games, timeout=None):
+        """
+        queues games games and yields the (generation, (positionData, moveProbData, valueData)) of each one as it comes back, in no particular order.
+        Raises a RuntimeError if no game comes back for timeout seconds, twice the jobTimeout by default, which means no worker is playing
+        """
+        if timeout is None:
+            timeout = 2 * self.jobTimeout
+        for _ in range(games):
+            self.jobs.put(self.nextJob)
+            self.nextJob += 1
+        for _ in range(games):
+            try:
+                yield self.results.get(timeout=timeout)
+            except queue.Empty:
+                raise RuntimeError(f"no game finished in {timeout}s, {self.workers} workers connected") from None
+
+    def close(self):
+        self.stopping.set()
+        self.server.close()
+        if self.path is not None:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def runWorker(address, tableSize=None, retryFor=10):
+    """
+    connects to the coordinator at address, trying for up to retryFor seconds as it may not be listening yet, and plays the games it hands out until it says stop
+    """
+    deadline = time.monotonic() + retryFor
+    while True:
+        sock = _socket(address)
+        try:
+            sock.connect(address)
+            break
+        except OSError:
+            sock.close()
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+    learner = None
+    with sock:
+        while True:
+            try:
+                kind, payload = receiveFrame(sock)
+            except ConnectionError:
+                return
+            if kind == STOP:
+                return
+            if kind == WEIGHTS:
+                generation, width, height = WEIGHTS_HEADER.unpack_from(payload)
+                network = NumpyNetwork.fromNpz(io.BytesIO(payload[WEIGHTS_HEADER.size:]))
+                learner = ReinfLearn(SymmetricNetwork(network, width=width, height=height), tableSize, width, height)
+            elif kind == JOB:
+                jobId, generation, simulations = JOB_MESSAGE.unpack(payload)
+                data = learner.playGame(SearchBudget(simulations) if simulations else None)
+                sendFrame(sock, RESULT, encodeGame(jobId, generation, *data))
+
+
+def _parseAddress(text):
+    """
+    host:port for TCP, anything else is the path of a Unix socket
+    """
+    host, _, port = text.rpartition(":")
+    return (host, int(port)) if host and port.isdigit() else text
+
+
+if __name__ == "__main__":
+    # python distributed.py worker host:port           connects a worker to a coordinator
+    # python distributed.py local model [workers] [games]  runs a coordinator with that many local worker processes and reports the games per second
+    if sys.argv[1] == "worker":
+        runWorker(_parseAddress(sys.argv[2]))
+    else:
+        path = sys.argv[2] if len(sys.argv) > 2 else "supervised_model.keras"
+        workers = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+        games = int(sys.argv[4]) if len(sys.argv) > 4 else 100
+        with Coordinator(loadNetwork(path)) as coordinator:
+            context = multiprocessing.get_context("spawn")
+            processes = [context.Process(target=runWorker, args=(coordinator.address,)) for _ in range(workers)]
+            for process in processes:
+                process.start()
+            start = time.perf_counter()
+            positions = sum(len(data[0]) for (_, data) in coordinator.playGames(games))
+            elapsed = time.perf_counter() - start
+            print(f"{games} games ({positions} positions) on {workers} workers in {elapsed:.2f}s, {games/elapsed:.1f} games/second, {coordinator.retries} retried")
+        for process in processes:
+            process.join()
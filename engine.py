@@ -0,0 +1,148 @@
+import time
+import numpy as np
+from Hexapawn import Board
+
+# a search engine to actually pick moves. The minimax in minimax.py has to visit every position to produce training data so it can't prune anything,
+# this one is only interested in the best move so it uses negamax with alpha-beta pruning, a transposition table and move ordering.
+# Meant as a fast and strong opponent to test the trained networks against
+
+WIN = 1000 # score of a win, reduced by the number of plies it takes so quicker wins are preferred
+DECIDED = 500 # scores beyond this are wins or losses found by the search, anything smaller is a guess of the evaluation
+
+EXACT = 0 # kinds of transposition table entries, alpha-beta only proves bounds for scores outside the window
+LOWER = 1
+UPPER = 2
+
+
+class _Timeout(Exception):
+    pass
+
+
+class Engine:
+    """
+    negamax search with alpha-beta pruning. Scores are from the point of view of the player to move, like the values the network is trained on.
+    If a network is given its priors order the moves and its value head evaluates positions where a depth limited search stops, otherwise those count as 0.
+    The transposition table is kept between searches as entries stay correct for as long as the network doesn't change
+    """
+
+    def __init__(self, network=None):
+        self.network = network
+        self.table = {} # Board.key -> (depth, score, kind, bestMove)
+        self.priors = {} # Board.key -> (policy, value) of the network
+        self.nodes = 0 # positions visited by the last search
+        self.depth = 0 # depth of the last completed iteration of the last search
+        self.deadline = None
+
+    def clear(self):
+        self.table.clear()
+        self.priors.clear()
+
+    def search(self, board, depth=None, timeLimit=None):
+        """
+        iterative deepening up to depth plies, or until the game is solved if depth is None. With a timeLimit in seconds the search stops when it runs out
+        and returns the result of the last finished iteration, the first iteration always finishes.
+        Returns (score, move) in the same order as minimax.minimax, the node count is left in self.nodes
+        """
+        self.nodes = 0
+        self.deadline = time.perf_counter() + timeLimit if timeLimit is not None else None
+        maxDepth = depth if depth is not None else 2 * board.geometry.squares # no game lasts longer than every pawn walking up the whole board
+        result = (0, None)
+        for iteration in range(1, maxDepth + 1):
+            try:
+                result = self.negamax(board, iteration, -WIN - 1, WIN + 1, 0, iteration > 1)
+            except _Timeout:
+                break
+            self.depth = iteration
+            if abs(result[0]) > DECIDED: # a forced win or loss, searching deeper won't change it
+                break
+        self.deadline = None
+        return result
+
+    def negamax(self, board, depth, alpha, beta, ply, timed=False):
+        self.nodes += 1
+        if timed and self.deadline is not None and self.nodes % 256 == 0 and time.perf_counter() > self.deadline:
+            raise _Timeout()
+
+        terminal, winner = board.isTerminal()
+        if terminal:
+            return (WIN - ply if winner == board.turn else ply - WIN), None
+        if depth == 0:
+            return self.evaluate(board), None
+
+        key = board.key()
+        entry = self.table.get(key)
+        hashMove = None
+        if entry is not None:
+            entryDepth, score, kind, hashMove = entry
+            score = self.fromTable(score, ply)
+            if entryDepth >= depth:
+                if kind == EXACT or (kind == LOWER and score >= beta) or (kind == UPPER and score <= alpha):
+                    return score, hashMove
+
+        originalAlpha = alpha
+        bestScore = -WIN - 1
+        bestMove = None
+        for move in self.orderMoves(board, hashMove):
+            board.applymove(move)
+            try:
+                score = - self.negamax(board, depth - 1, -beta, -alpha, ply + 1, timed)[0]
+            finally: # a _Timeout unwinds through here too, so the board is back where the search started
+                board.undomove()
+            if score > bestScore:
+                bestScore = score
+                bestMove = move
+            alpha = max(alpha, score)
+            if alpha >= beta: # the opponent won't allow this position, no need to look at the other moves
+                break
+
+        kind = UPPER if bestScore <= originalAlpha else LOWER if bestScore >= beta else EXACT
+        self.table[key] = (depth, self.toTable(bestScore, ply), kind, bestMove)
+        return bestScore, bestMove
+
+    def toTable(self, score, ply):
+        """
+        wins and losses are stored relative to the position rather than the root so the entry is right whatever ply the position is found at
+        """
+        if score > DECIDED:
+            return score + ply
+        if score < -DECIDED:
+            return score - ply
+        return score
+
+    def fromTable(self, score, ply):
+        if score > DECIDED:
+            return score - ply
+        if score < -DECIDED:
+            return score + ply
+        return score
+
+    def networkOutput(self, board):
+        key = board.key()
+        if key not in self.priors:
+            q = self.network.predict(np.array([board.toNetworkInput()]), verbose=0)
+            self.priors[key] = (q[0][0], float(q[1][0][0]))
+        return self.priors[key]
+
+    def evaluate(self, board):
+        """
+        guess for a position where the depth runs out, the network value scaled to stay below the scores of decided games
+        """
+        if self.network is None:
+            return 0
+        return int(round(self.networkOutput(board)[1] * (DECIDED - 10)))
+
+    def orderMoves(self, board, hashMove):
+        """
+        the best move from the transposition table first, then captures, then the rest. With a network the moves are sorted by prior instead of by captures
+        """
+        moves = board.generateMoves()
+        if self.network is not None:
+            policy = self.networkOutput(board)[0]
+            moves = [move for (_, move) in sorted(zip(-policy[board.moveIndices()], moves), key=lambda pair: pair[0])]
+        else:
+            opponent = board.black if board.turn == Board.WHITE else board.white
+            moves = sorted(moves, key=lambda move: not (opponent >> move[1]) & 1)
+        if hashMove in moves:
+            moves.remove(hashMove)
+            moves.insert(0, hashMove)
+        return moves
@@ -0,0 +1,149 @@
+import queue
+import threading
+import time
+import numpy as np
+
+# an inference server so many searches running at the same time can share the network.
+# Every Node.expand asks for a single position which is a waste of a network call, so instead the requests are queued and a
+# dedicated thread evaluates whatever has piled up in one batched predict call
+
+
+class _Request:
+    """
+    one predict call waiting for its answer. The caller blocks on the event until the server thread fills in the result
+    """
+    __slots__ = ("inputs", "event", "result", "error", "submitted")
+
+    def __init__(self, inputs):
+        self.inputs = inputs
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.submitted = time.perf_counter()
+
+
+class InferenceServer:
+    """
+    wraps a model and has the same predict method, so it can be handed to MCTS, ReinfLearn or rand_vs_network in place of the Keras model.
+    Requests are collected until there are maxBatchSize positions or the oldest one has waited maxWait seconds, then they are evaluated together.
+    Should be used as a context manager or stopped with stop() so the thread doesn't outlive the model. predict raises a RuntimeError once it is stopped
+    """
+
+    def __init__(self, model, maxBatchSize=64, maxWait=0.002):
+        self.model = model
+        self.maxBatchSize = maxBatchSize
+        self.maxWait = maxWait
+        self.requests = queue.Queue()
+        self.lock = threading.Lock() # guards stopped and the statistics below as they are read from other threads
+        self.stopped = False
+        self.batches = 0
+        self.requestCount = 0
+        self.positions = 0
+        self.totalLatency = 0
+        self.maxLatency = 0
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def predict(self, x, verbose=0):
+        """
+        queues the positions and waits for the server thread to evaluate them. Returns the same [policy, value] list as the Keras model
+        """
+        request = _Request(np.asarray(x, dtype=np.float32))
+        with self.lock: # so no request can be queued behind the one telling the thread to stop
+            if self.stopped:
+                raise RuntimeError("the inference server has been stopped")
+            self.requests.put(request)
+        request.event.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def run(self):
+        """
+        the loop of the server thread. Blocks until a request arrives then keeps collecting until the batch is full or maxWait has passed
+        """
+        stopping = False
+        while not stopping:
+            request = self.requests.get()
+            if request is None:
+                break
+            batch = [request]
+            size = len(request.inputs)
+            deadline = time.perf_counter() + self.maxWait
+            while size < self.maxBatchSize:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    request = self.requests.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if request is None: # finish this batch before stopping
+                    stopping = True
+                    break
+                batch.append(request)
+                size += len(request.inputs)
+            self.evaluate(batch, size)
+        while True: # nothing should be left but a caller must never be left waiting for an answer that won't come
+            try:
+                request = self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None:
+                request.error = RuntimeError("the inference server has been stopped")
+                request.event.set()
+
+    def evaluate(self, batch, size):
+        try:
+            policy, value = self.model.predict(np.concatenate([request.inputs for request in batch]), verbose=0)
+        except Exception as error: # hand the error to the waiting callers instead of killing the server thread
+            for request in batch:
+                request.error = error
+                request.event.set()
+            return
+
+        done = time.perf_counter()
+        start = 0
+        for request in batch: # give every request back its own rows
+            end = start + len(request.inputs)
+            request.result = [policy[start:end], value[start:end]]
+            start = end
+            request.event.set()
+
+        with self.lock:
+            self.batches += 1
+            self.requestCount += len(batch)
+            self.positions += size
+            for request in batch:
+                latency = done - request.submitted
+                self.totalLatency += latency
+                self.maxLatency = max(self.maxLatency, latency)
+
+    def stats(self):
+        """
+        returns how full the batches were on average (as a fraction of maxBatchSize) and how long requests waited for their answers, in seconds
+        """
+        with self.lock:
+            return {
+                "batches": self.batches,
+                "requests": self.requestCount,
+                "positions": self.positions,
+                "meanBatchSize": self.positions / self.batches if self.batches else 0,
+                "meanBatchFill": self.positions / (self.batches * self.maxBatchSize) if self.batches else 0,
+                "meanLatency": self.totalLatency / self.requestCount if self.requestCount else 0,
+                "maxLatency": self.maxLatency,
+            }
+
+    def stop(self):
+        with self.lock:
+            if self.stopped:
+                return
+            self.stopped = True
+            self.requests.put(None)
+        self.thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
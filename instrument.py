@@ -0,0 +1,71 @@
+import json
+import time
+
+# counters and timers for the hot paths of the search and the self-play, to see where the time actually goes.
+# They are off by default and every instrumented spot first checks stats.enabled, so when off they cost a single attribute lookup
+
+
+class Stats:
+    """
+    named counters and accumulated wall times in seconds. When enabled with a logPath, events like finished searches and moves are also written
+    to that file as one JSON object per line
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.counters = {}
+        self.timers = {}
+        self.logFile = None
+
+    def enable(self, logPath=None):
+        self.enabled = True
+        if logPath is not None:
+            self.logFile = open(logPath, "a")
+
+    def disable(self):
+        self.enabled = False
+        if self.logFile is not None:
+            self.logFile.close()
+            self.logFile = None
+
+    def reset(self):
+        self.counters = {}
+        self.timers = {}
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def addTime(self, name, seconds):
+        self.timers[name] = self.timers.get(name, 0) + seconds
+
+    def log(self, event, **fields):
+        if self.logFile is not None:
+            fields["event"] = event
+            fields["time"] = time.time()
+            self.logFile.write(json.dumps(fields) + "\n")
+            self.logFile.flush()
+
+    def recordSearch(self, start, simulations):
+        """
+        books a finished search that started at the time.perf_counter() start and ran simulations simulations, shared by MCTS and ArrayMCTS
+        so both report searches the same way
+        """
+        elapsed = time.perf_counter() - start
+        self.addTime("search", elapsed)
+        self.count("searches")
+        self.count("simulations", simulations)
+        self.log("search", simulations=simulations, seconds=elapsed, simulationsPerSecond=simulations/elapsed if elapsed else 0)
+
+    def snapshot(self):
+        """
+        copy of the counters and timers plus a few numbers worked out from them: simulations per second and mean batch size
+        """
+        result = {"counters": dict(self.counters), "timers": dict(self.timers)}
+        if self.timers.get("search"):
+            result["simulationsPerSecond"] = self.counters.get("simulations", 0) / self.timers["search"]
+        if self.counters.get("batches"):
+            result["meanBatchSize"] = self.counters.get("batchPositions", 0) / self.counters["batches"]
+        return result
+
+
+stats = Stats() # the one instance everything reports to
@@ -1,8 +1,12 @@
-import copy
 import math
 import random
+import time
+from collections import OrderedDict
 import numpy as np
 from Hexapawn import Board
+from instrument import stats
+from arraymcts import ArrayMCTS
+from budget import SearchBudget
 
 # create the Monte-Carlo Tree Search to be used an alternative to generate training data and also as a facility for Reinforcement Learning
 # This is my first encounter with MCTS so admittedly a lot of my ideas are derivative from the book
@@ -11,6 +15,7 @@ class Edge:
     """
     A class for edges connecting Nodes. Serves as an object that sits on specific moves and holds all the variables used for the MCTS which I'd expect from my little experience
     with data structures to be held by the Node. Also the MCTS doesn't seem to be a tree but much closer to a graph but oh well.
+    With a TranspositionTable it actually becomes one, a Node reached by different move orders is shared so it can have several parent Edges
     """
     def __init__(self, move, parentNode):
         """
@@ -31,7 +36,8 @@ class Edge:
 
 class Node:
     """
-    initialised with the specific board position just like the nodes of a minimax tree but also with a parentEdge
+    initialised with the specific board position just like the nodes of a minimax tree but also with a parentEdge.
+    When the node is shared through a TranspositionTable the parentEdge is only the edge it was first reached from, so the search keeps track of the path it took instead
     """
 
     def __init__(self, board, parentEdge):
@@ -39,36 +45,92 @@ class Node:
         self.parentEdge = parentEdge
         self.childEdgeNode = []
 
-    def expand(self, network):
+    def expand(self, network, table=None):
         """
         Expand a leaf position to add all possible resulting position to the tree and initialise edges with the priror network probabilities
         """
+        start = time.perf_counter() if stats.enabled else 0
         q = network.predict(np.array([self.board.toNetworkInput()]))
+        if stats.enabled:
+            stats.addTime("inference", time.perf_counter() - start)
+            stats.count("inferenceCalls")
+            stats.count("inferencePositions")
+        return self.expandFromOutput(q[0][0], q[1][0][0], table)
+
+    def expandFromOutput(self, policy, value, table=None):
+        """
+        the actual expansion, split out of expand so the network output can come from anywhere, for instance from a batch of positions evaluated together.
+        If a TranspositionTable is given, child positions already in it are linked to the existing node, statistics and all, instead of getting a new one
+        """
+        start = time.perf_counter() if stats.enabled else 0
         total_prob = 0
-        for move in self.board.generateMoves():
+        for move, index in zip(self.board.generateMoves(), self.board.moveIndices()):
             childEdge = Edge(move, self)
-            childEdge.P = q[0][0][self.board.getNetworkOutputIndex(move)]
+            childEdge.P = policy[index]
             total_prob += childEdge.P
-            tmp = copy.deepcopy(self.board) # just like with the minimax, a new board object is created for every new added node
-            tmp.applymove(move)
-            childNode = Node(tmp, childEdge)
+            childNode = None
+            if table is not None:
+                self.board.applymove(move)
+                key = self.board.key()
+                self.board.undomove()
+                childNode = table.get(key)
+            if childNode is None:
+                tmp = self.board.copy() # every node needs its own board, Board.copy only copies the bitboards so it is much cheaper than a deepcopy
+                tmp.applymove(move)
+                childNode = Node(tmp, childEdge)
+                if stats.enabled:
+                    stats.count("nodesCreated")
+                if table is not None:
+                    table.put(key, childNode)
+            elif stats.enabled:
+                stats.count("transpositions")
             self.childEdgeNode.append((childEdge, childNode))
 
         for (edge, _) in self.childEdgeNode:
             edge.P /= total_prob # scale up the probabilities of legal moves after removing illegal moves
+        if stats.enabled:
+            stats.addTime("expand", time.perf_counter() - start) # building the children, board copies included, without the network call
         
-        return q[1][0][0] # returns predicted network evaluation, will be useful during the expand_and_evaluate step
+        return value # returns predicted network evaluation, will be useful during the expand_and_evaluate step
     
     def isLeaf(self):
         return len(self.childEdgeNode) == 0
     
+class TranspositionTable:
+    """
+    Nodes of the search stored by Board.key so a position reached through different move orders is only expanded, and sent through the network, once.
+    It holds at most maxSize nodes and throws out the least recently used one when full. Thrown out nodes stay in the tree they are already part of,
+    they just stop being shared with new paths
+    """
+
+    def __init__(self, maxSize=100000):
+        self.maxSize = maxSize
+        self.nodes = OrderedDict()
+
+    def get(self, key):
+        node = self.nodes.get(key)
+        if node is not None:
+            self.nodes.move_to_end(key) # mark as recently used
+        return node
+
+    def put(self, key, node):
+        self.nodes[key] = node
+        self.nodes.move_to_end(key)
+        if len(self.nodes) > self.maxSize:
+            self.nodes.popitem(last=False) # evict the least recently used node
+
+    def __len__(self):
+        return len(self.nodes)
+
 class MCTS:
 
-    def __init__(self, network):
+    def __init__(self, network, table=None, c_puct=1, tau=1):
         self.network = network
+        self.table = table # optional TranspositionTable, turns the tree into a graph
         self.rootNode = None
-        self.c_puct = 1
-        self.tau = 1
+        self.c_puct = c_puct
+        self.tau = tau
+        self.virtualLoss = 1 # number of lost games temporarily added to every edge on the path to a leaf waiting for its batch evaluation
 
     def uct_value(self, edge, parentN):
         """
@@ -77,105 +139,280 @@ class MCTS:
         return self.c_puct * edge.P * (math.sqrt(parentN))/(edge.N + 1)
     
     def select(self, node):
+        """
+        walks down from the given node to a leaf and returns the leaf together with the path of edges taken, starting with the parentEdge of the given node.
+        Nodes can have more than one parent with a TranspositionTable so the path, not the parentEdge links, is what gets backed up later
+        """
         walk = node
+        path = [node.parentEdge]
         while not walk.isLeaf():
+            # visits of the node itself, its expansion and one per visit of a child. The edge it was reached by only counts the visits through that path,
+            # which is 0 for a node shared through the TranspositionTable the first time a new edge leads to it
+            parentN = 1 + sum(edge.N for (edge, _) in walk.childEdgeNode)
             best_nodes= [] # incase there are multiple equally good nodes
             max_uct_value = -1000000
             for (edge, node) in walk.childEdgeNode: # find maximum "uct_value"
-                uct_value = edge.Q + self.uct_value(edge, walk.parentEdge.N)
+                uct_value = edge.Q + self.uct_value(edge, parentN)
                 if uct_value > max_uct_value:
                     max_uct_value = uct_value
             for (edge, node) in walk.childEdgeNode: # append all equally good nodes and pick a random one
-                if  edge.Q + self.uct_value(edge, walk.parentEdge.N) == max_uct_value:
-                    best_nodes.append(node)
-            walk = random.choice(best_nodes) # choosing at random helps with exploration of the tree
-        return walk
+                if  edge.Q + self.uct_value(edge, parentN) == max_uct_value:
+                    best_nodes.append((edge, node))
+            edge, walk = random.choice(best_nodes) # choosing at random helps with exploration of the tree
+            path.append(edge)
+        return walk, path
     
-    def expand_and_evaluate(self, node):
+    def expand_and_evaluate(self, node, path):
         """
           attempt to show the evaluation from the perspective of the player, the weird negation is a side-effect of the applymove method changing the player turn immediately
           after a move is made. Therefore in a terminal position, the last player won't be shown when board.turn is checked.  
         """
-        if node.board.isTerminal()[0]:
-            v = -1 if node.board.isTerminal()[1] == node.board.turn else 1 
-            self.backpropagate(v, node.parentEdge)
+        start = time.perf_counter() if stats.enabled else 0
+        terminal, winner = node.board.isTerminal()
+        if stats.enabled:
+            stats.addTime("isTerminal", time.perf_counter() - start)
+        if terminal:
+            v = -1 if winner == node.board.turn else 1 
         else:
-            v = - node.expand(self.network) 
-            self.backpropagate(v, node.parentEdge)
-
-    def backpropagate(self, v, edge):
-        edge.N += 1
-        edge.W += v
-        edge.Q = edge.W/edge.N
-        if edge.parentNode:
-            if edge.parentNode.parentEdge:
-                self.backpropagate(-v, edge.parentNode.parentEdge) # -v because a win for a player is a loss for a player one up the tree and vice-versa
-
-    def search(self, rootNode):
+            v = - node.expand(self.network, self.table) 
+        start = time.perf_counter() if stats.enabled else 0
+        self.backpropagate(v, path)
+        if stats.enabled:
+            stats.addTime("backpropagate", time.perf_counter() - start)
+
+    def backpropagate(self, v, path):
+        """
+        updates every edge on the path from the leaf back up to the root
+        """
+        for edge in reversed(path):
+            edge.N += 1
+            edge.W += v
+            edge.Q = edge.W/edge.N
+            v = -v # -v because a win for a player is a loss for a player one up the tree and vice-versa
+
+    def applyVirtualLoss(self, path, sign):
+        """
+        adds (sign = 1) or removes (sign = -1) a virtual loss on every edge of the path to a leaf. The path then looks worse to select
+        so the next leaf picked for the same batch is likely to be a different one
+        """
+        for edge in path:
+            edge.N += sign * self.virtualLoss
+            edge.W -= sign * self.virtualLoss
+            edge.Q = edge.W/edge.N if edge.N else 0
+
+    def search(self, rootNode, budget=None):
+        """
+        play sequences of moves from the rootNode to build up statistical information for as long as the SearchBudget allows, 100 simulations by default
+        """
+        if budget is None:
+            budget = SearchBudget()
+        searchStart = time.perf_counter() if stats.enabled else 0
+        self.rootNode = rootNode
+        if self.rootNode.isLeaf(): # the root can already be expanded if it came out of the TranspositionTable
+            forced = self.forcedMove(searchStart)
+            if forced is not None:
+                return forced
+            self.rootNode.expand(self.network, self.table) 
+        simulations = 0
+        forced = len(self.rootNode.childEdgeNode) == 1 # nothing to think about with a single legal move
+        budget.start()
+        while not forced and not budget.done(simulations, self.rootCounts):
+            simulations += 1
+            start = time.perf_counter() if stats.enabled else 0
+            node, path = self.select(rootNode)
+            if stats.enabled:
+                stats.addTime("select", time.perf_counter() - start)
+            self.expand_and_evaluate(node, path)
+        if stats.enabled:
+            stats.recordSearch(searchStart, simulations)
+        return self.moveProbabilities()
+
+    def forcedMove(self, searchStart):
+        """
+        the move probabilities of an unexpanded root with a single legal move, that move with probability 1, without asking the network. None otherwise
+        """
+        moves = self.rootNode.board.generateMoves()
+        if len(moves) != 1:
+            return None
+        if stats.enabled:
+            stats.recordSearch(searchStart, 0)
+        return [(moves[0], 1, 0, 0)]
+
+    def rootCounts(self):
+        return [edge.N for (edge, _) in self.rootNode.childEdgeNode]
+
+    def batchedSearch(self, rootNode, batchSize=8, budget=None):
+        """
+        same as search but the leaves are collected batchSize at a time and the network evaluates all of them with a single predict call.
+        Each selected leaf puts a virtual loss on its path so the following selections spread out over the tree instead of all picking the same leaf.
+        Terminal leaves don't need the network so they are backed up straight away. The budget is checked between batches
+        """
+        if budget is None:
+            budget = SearchBudget()
+        searchStart = time.perf_counter() if stats.enabled else 0
         self.rootNode = rootNode
-        self.rootNode.expand(self.network) 
-        for _ in range(100): # play a sequence of moves 100 times to build up statistical information
-            node = self.select(rootNode)
-            self.expand_and_evaluate(node)
+        if self.rootNode.isLeaf():
+            forced = self.forcedMove(searchStart)
+            if forced is not None:
+                return forced
+            self.rootNode.expand(self.network, self.table)
+        simulations = 0
+        forced = len(self.rootNode.childEdgeNode) == 1
+        budget.start()
+        while not forced and not budget.done(simulations, self.rootCounts):
+            leaves = []
+            remaining = budget.remaining(simulations)
+            for _ in range(batchSize if remaining is None else min(batchSize, remaining)):
+                start = time.perf_counter() if stats.enabled else 0
+                node, path = self.select(rootNode)
+                if stats.enabled:
+                    stats.addTime("select", time.perf_counter() - start)
+                simulations += 1
+                if node.board.isTerminal()[0]:
+                    self.expand_and_evaluate(node, path)
+                else:
+                    self.applyVirtualLoss(path, 1)
+                    leaves.append((node, path))
+            if len(leaves) == 0:
+                continue
+
+            unique = list({id(node): node for (node, _) in leaves}.values()) # the same leaf can still be picked twice, it only needs evaluating once
+            start = time.perf_counter() if stats.enabled else 0
+            q = self.network.predict(np.array([node.board.toNetworkInput() for node in unique]))
+            if stats.enabled:
+                stats.addTime("inference", time.perf_counter() - start)
+                stats.count("inferenceCalls")
+                stats.count("inferencePositions", len(unique))
+                stats.count("batches")
+                stats.count("batchPositions", len(unique))
+            values = {}
+            for i, node in enumerate(unique):
+                values[id(node)] = - node.expandFromOutput(q[0][i], q[1][i][0], self.table)
+            start = time.perf_counter() if stats.enabled else 0
+            for (node, path) in leaves:
+                self.applyVirtualLoss(path, -1)
+                self.backpropagate(values[id(node)], path)
+            if stats.enabled:
+                stats.addTime("backpropagate", time.perf_counter() - start)
+        if stats.enabled:
+            stats.recordSearch(searchStart, simulations)
+        return self.moveProbabilities()
+
+    def advance(self, move):
+        """
+        makes the child reached by the given move the new root, keeping all the statistics gathered under it by the last search.
+        The edge leading to it becomes the new root edge and its link back to the old root is cut, so the rest of the old tree is left for the garbage collector
+        """
+        for (edge, node) in self.rootNode.childEdgeNode:
+            if edge.move == move:
+                edge.parentNode = None
+                edge.N = max(edge.N, 1) # same reason the rootEdge starts with a N of 1
+                node.parentEdge = edge
+                self.rootNode = node
+                return node
+        # the root was never expanded, which happens after a forced move, so the child starts a new tree
+        board = self.rootNode.board.copy()
+        board.applymove(move)
+        edge = Edge(move, None)
+        edge.N = 1
+        node = self.table.get(board.key()) if self.table is not None else None
+        if node is None:
+            node = Node(board, edge)
+            if self.table is not None:
+                self.table.put(board.key(), node)
+        node.parentEdge = edge
+        self.rootNode = node
+        return node
+
+    def moveProbabilities(self):
         move_prob = []
+        total = sum(edge.N ** (1/self.tau) for (edge, _) in self.rootNode.childEdgeNode)
         for (edge, node) in self.rootNode.childEdgeNode:
-            prob = (edge.N ** (1/self.tau))/(sum(edge.N **(1/self.tau) for (edge, _) in self.rootNode.childEdgeNode)) # find the probability of each move using Node count
+            if total:
+                prob = (edge.N ** (1/self.tau))/total # find the probability of each move using Node count
+            else:
+                prob = 1/len(self.rootNode.childEdgeNode) # a forced move that wasn't searched
             move_prob.append((edge.move, prob, edge.N, edge.Q))
         return move_prob
 
 class ReinfLearn:
 
-    def __init__(self, model):
+    def __init__(self, model, tableSize=None, width=3, height=3, arrayTree=False):
         self.model = model
+        self.tableSize = tableSize # if set, every game gets a TranspositionTable of this size shared by all of its searches
+        self.width = width # size of the board the games are played on, the model has to match it
+        self.height = height
+        self.arrayTree = arrayTree # search with ArrayMCTS instead, which keeps the tree in NumPy arrays and has no TranspositionTable
 
-    def playGame(self):
+    def playGame(self, budget=None):
         """
-        play a game using the same network and MCTS and record all positions that occurred in the games alongside the move_prob and the eventual score of each player
+        play a game using the same network and MCTS and record all positions that occurred in the games alongside the move_prob and the eventual score of each player.
+        Every move is searched with the given SearchBudget, 100 simulations by default
         """
         positionData = []
         moveProbData = []
         valueData = []
 
-        board = Board()
+        board = Board(self.width, self.height)
         board.setStartingPosition()
+        table = TranspositionTable(self.tableSize) if self.tableSize else None # a new table every game as the model may have been trained in between
+        if self.arrayTree:
+            mcts = ArrayMCTS(self.model, self.width, self.height)
+        else:
+            mcts = MCTS(self.model, table) # one search for the whole game so the tree can be carried over from move to move
+        rootEdge = Edge(None, None)
+        rootEdge.N = 1 # the rootEdge is give a N of 1 else uct of the children edges throw errors
+        rootNode = Node(board.copy(), rootEdge) # a copy so the nodes never see the game board change under them
 
+        gameStart = time.perf_counter() if stats.enabled else 0
         while not board.isTerminal()[0]:
+            moveStart = time.perf_counter() if stats.enabled else 0
             positionData.append(board.toNetworkInput())
-            rootEdge = Edge(None, None)
-            rootNode = Node(board, rootEdge)
-            rootEdge.N = 1 # the rootEdge is give a N of 1 else uct of the children edges throw errors
-            mcts = MCTS(self.model)
-            moveVector = [0 for _ in range(14)]
-            moveProb = mcts.search(rootNode) # use MCTS
+            moveVector = [0 for _ in range(board.policySize)]
+            moveProb = mcts.search(board, budget) if self.arrayTree else mcts.search(rootNode, budget) # use MCTS
            
             for (move, prob, _ , _) in moveProb:
                 moveVector[board.getNetworkOutputIndex(move)] = prob # records the probability of each move index
 
             rand_idx = np.random.multinomial(1, moveVector) # use numpy to choose a random move_index based on the probabilities
             idx = np.where(rand_idx==1)[0][0]
-            move_choice = None
+            move_choice = board.generateMoves()[board.moveIndices().index(idx)] # find said move
 
-            for (move, prob, _, _) in moveProb: # find said move
-                if board.getNetworkOutputIndex(move) == idx:
-                    move_choice = move
-            
             moveProbData.append(moveVector)
-            board.applymove(move_choice)
-
-        if board.isTerminal()[1] == board.WHITE:
+            if self.arrayTree:
+                mcts.advance(board, move_choice)
+                board.applymove(move_choice)
+            else:
+                board.applymove(move_choice)
+                rootNode = mcts.advance(move_choice) # the subtree under the chosen move becomes the tree for the next search
+            if stats.enabled:
+                elapsed = time.perf_counter() - moveStart
+                stats.addTime("move", elapsed)
+                stats.count("moves")
+                stats.log("move", ply=len(positionData), seconds=elapsed)
+
+        winner = board.isTerminal()[1]
+        if winner == board.WHITE:
             for i in range(len(positionData)): # if white won that every black position has a score of -1
                 valueData.append((-1)**i)
 
         else:
             for i in range(len(positionData)): # opposite
                 valueData.append((-1)**(i+1))
-            
+
+        if stats.enabled:
+            elapsed = time.perf_counter() - gameStart
+            stats.addTime("game", elapsed)
+            stats.count("games")
+            stats.log("game", plies=len(positionData), seconds=elapsed)
         return (positionData, moveProbData, valueData)
 
 
             
 # Remark
 
+# With a TranspositionTable nodes are shared between paths so the tree is really a graph, the parentEdge of a Node is only used as the start of the search path now
+
 # May change the Edge class to be more like a traditional linked list with a parent Node and child Node, that way the Node only needs to have childEdges instead of childEdgeNodes
 
 # the uct_value method does not need to have the parentN argument. Should change that in a later commit
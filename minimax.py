@@ -1,4 +1,3 @@
-import copy
 from Hexapawn import Board
 
 # create minimax function to be used to generate training data for the Neural Network
@@ -12,8 +11,9 @@ def minimax(board, input_list, output_list1, output_list2):
     of O(nlogn). 
     """
 
-    if board.isTerminal()[0]:
-        if board.isTerminal()[1] == Board.WHITE:
+    terminal, winner = board.isTerminal()
+    if terminal:
+        if winner == Board.WHITE:
             return 1, None
         else:
             return -1, None
@@ -22,9 +22,9 @@ def minimax(board, input_list, output_list1, output_list2):
         best_score = -10
         best_move = None
         for move in board.generateMoves():
-            tmp = copy.deepcopy(board)
-            tmp.applymove(move)
-            score = minimax(tmp, input_list, output_list1, output_list2)[0]
+            board.applymove(move) # play the move on the same board and take it back afterwards instead of copying the board for every child
+            score = minimax(board, input_list, output_list1, output_list2)[0]
+            board.undomove()
             if score > best_score:
                 best_score = score
                 best_move = move
@@ -33,15 +33,15 @@ def minimax(board, input_list, output_list1, output_list2):
         best_score = 10
         best_move = None
         for move in board.generateMoves():
-            tmp = copy.deepcopy(board)
-            tmp.applymove(move)
-            score = minimax(tmp, input_list, output_list1, output_list2)[0]
+            board.applymove(move) # play the move on the same board and take it back afterwards instead of copying the board for every child
+            score = minimax(board, input_list, output_list1, output_list2)[0]
+            board.undomove()
             if score < best_score:
                 best_score = score
                 best_move = move
 
     input_list.append(board.toNetworkInput()) # convert each non-terminal position into NN input and append them to the data_list
-    move_vector = [0 for i in range(14)]
+    move_vector = [0 for i in range(board.policySize)]
     move_vector[board.getNetworkOutputIndex(best_move)] = 1 # change only the index of the best_move to 1 and leave the rest as 0s
     output_list1.append(move_vector)
     output_list2.append(best_score if board.turn == Board.WHITE else - best_score) # the NN sees positions from player's perspective so scores should be adjusted to show that
@@ -0,0 +1,191 @@
+import io
+import json
+import os
+import zipfile
+import numpy as np
+
+# the network from model.py is tiny so running it through Keras is mostly paying for the framework.
+# This pulls the weights out of a saved .keras file and does the same forward pass with plain NumPy matrix products.
+# Reading a .keras file still needs h5py, which takes a good part of a second to import, so the weights can also be exported to a plain .npz file
+# that only needs NumPy. loadNetwork picks the right loader from the file name and only imports TensorFlow when a real Keras model is asked for
+
+
+def _relu(x):
+    return np.maximum(x, 0)
+
+
+def _softmax(x):
+    e = np.exp(x - x.max(axis=1, keepdims=True)) # subtracting the max keeps exp from overflowing without changing the result
+    return e / e.sum(axis=1, keepdims=True)
+
+
+ACTIVATIONS = {"relu": _relu, "softmax": _softmax, "tanh": np.tanh, "linear": lambda x: x}
+
+
+def _layerName(path):
+    """
+    name of the layer a weights group belongs to, Keras 2 stores them as _layer_checkpoint_dependencies\\dense_2 and Keras 3 as layers/dense_2
+    """
+    return path.replace("\\", "/").split("/")[-1]
+
+
+def _creationOrder(name):
+    """
+    Keras names layers dense, dense_1, dense_2... in the order they were created, so the number at the end gives that order back
+    """
+    suffix = name.rsplit("_", 1)[-1]
+    return int(suffix) if suffix.isdigit() else 0
+
+
+class NumpyNetwork:
+    """
+    the policy and value network of model.py run with NumPy. Holds the hidden Dense layers in order plus the two heads,
+    each as a (kernel, bias, activation) triple. Has the same predict method as the Keras model so it can be used by MCTS, ReinfLearn and rand_vs_network
+    """
+
+    def __init__(self, hidden, policyHead, valueHead):
+        self.hidden = hidden
+        self.policyHead = policyHead
+        self.valueHead = valueHead
+
+    @classmethod
+    def fromKeras(cls, path):
+        """
+        reads the layer list from config.json and the weights from model.weights.h5 inside the .keras zip file.
+        The names of the weights groups don't always match the layer names in the config (Keras 2 renumbers them when saving),
+        in that case they are matched up by the order the layers were created
+        """
+        import h5py
+
+        with zipfile.ZipFile(path) as archive:
+            config = json.loads(archive.read("config.json"))
+            weightsFile = h5py.File(io.BytesIO(archive.read("model.weights.h5")), "r")
+
+        layers = [layer for layer in config["config"]["layers"] if layer["class_name"] == "Dense"]
+        groups = {} # layer name -> path of its vars group in the h5 file
+
+        def collect(name, item):
+            if name.endswith("/vars/0") and len(item.shape) == 2: # a 2D first variable is the kernel of a Dense layer
+                groups[_layerName(name[:-len("/vars/0")])] = name[:-len("/0")]
+
+        weightsFile.visititems(collect)
+        names = [layer["config"]["name"] for layer in layers]
+        if not all(name in groups for name in names):
+            ordered = sorted(groups, key=_creationOrder)
+            groups = {name: groups[group] for name, group in zip(names, ordered)}
+
+        hidden = []
+        heads = {}
+        for layer in layers:
+            name = layer["config"]["name"]
+            dense = (np.array(weightsFile[groups[name] + "/0"], dtype=np.float32),
+                     np.array(weightsFile[groups[name] + "/1"], dtype=np.float32),
+                     layer["config"]["activation"])
+            if name in ("policyHead", "valueHead"):
+                heads[name] = dense
+            else:
+                hidden.append(dense)
+        weightsFile.close()
+        return cls(hidden, heads["policyHead"], heads["valueHead"])
+
+    @classmethod
+    def fromNpz(cls, path):
+        """
+        loads weights written by save
+        """
+        with np.load(path) as arrays:
+            activations = [str(activation) for activation in arrays["activations"]]
+            layers = [(arrays[f"kernel{i}"], arrays[f"bias{i}"], activation) for i, activation in enumerate(activations)]
+        return cls(layers[:-2], layers[-2], layers[-1])
+
+    def save(self, path):
+        """
+        writes the weights to an .npz file, the hidden layers in order followed by the policy and the value head
+        """
+        layers = self.hidden + [self.policyHead, self.valueHead]
+        arrays = {"activations": np.array([activation for (_, _, activation) in layers])}
+        for i, (kernel, bias, _) in enumerate(layers):
+            arrays[f"kernel{i}"] = kernel
+            arrays[f"bias{i}"] = bias
+        np.savez(path, **arrays)
+
+    @classmethod
+    def fromModel(cls, model):
+        """
+        copies the weights of a Keras model that is already loaded, for handing the latest weights to self-play without saving and reloading a .keras file
+        """
+        hidden = []
+        heads = {}
+        for layer in model.layers:
+            if type(layer).__name__ != "Dense":
+                continue
+            kernel, bias = layer.get_weights()
+            dense = (np.array(kernel, dtype=np.float32), np.array(bias, dtype=np.float32), layer.get_config()["activation"])
+            if layer.name in ("policyHead", "valueHead"):
+                heads[layer.name] = dense
+            else:
+                hidden.append(dense)
+        return cls(hidden, heads["policyHead"], heads["valueHead"])
+
+    def predict(self, x, verbose=0):
+        """
+        forward pass for a single position or a batch of them. Returns [policy, value] with shapes (N, 14) and (N, 1) just like the Keras model
+        """
+        x = np.asarray(x, dtype=np.float32)
+        if x.ndim == 1:
+            x = x[np.newaxis]
+        for (kernel, bias, activation) in self.hidden:
+            x = ACTIVATIONS[activation](x @ kernel + bias)
+        policy = ACTIVATIONS[self.policyHead[2]](x @ self.policyHead[0] + self.policyHead[1])
+        value = ACTIVATIONS[self.valueHead[2]](x @ self.valueHead[0] + self.valueHead[1])
+        return [policy, value]
+
+
+def loadNetwork(path, backend="numpy"):
+    """
+    loads a saved network for playing. With the numpy backend an .npz file is read directly and a .keras file through fromKeras, neither imports TensorFlow.
+    The keras backend loads the .keras file as a real Keras model, importing TensorFlow only then
+    """
+    if backend == "keras":
+        from tensorflow import keras
+        return keras.models.load_model(path)
+    if backend != "numpy":
+        raise ValueError(f"unknown network backend {backend}")
+    if os.path.splitext(path)[1] == ".npz":
+        return NumpyNetwork.fromNpz(path)
+    return NumpyNetwork.fromKeras(path)
+
+
+def export(path, npzPath=None):
+    """
+    writes the weights of the .keras file at path to an .npz file next to it, or to npzPath. Returns the path written
+    """
+    npzPath = npzPath or os.path.splitext(path)[0] + ".npz"
+    NumpyNetwork.fromKeras(path).save(npzPath)
+    return npzPath
+
+
+def checkAgainstKeras(path, inputs=None):
+    """
+    runs the same positions through Keras and the NumpyNetwork and returns the largest difference of the policy and of the value outputs.
+    Uses every position of the minimax training data by default
+    """
+    from tensorflow import keras
+
+    if inputs is None:
+        inputs = np.load("inputData.npy")
+    kerasPolicy, kerasValue = keras.models.load_model(path).predict(inputs, verbose=0)
+    numpyPolicy, numpyValue = NumpyNetwork.fromKeras(path).predict(inputs)
+    return np.abs(kerasPolicy - numpyPolicy).max(), np.abs(kerasValue - numpyValue).max()
+
+
+if __name__ == "__main__":
+    # python numpynet.py [model.keras] compares the NumPy forward pass with Keras, python numpynet.py --export model.keras... writes an .npz for each model
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == "--export":
+        for path in sys.argv[2:]:
+            print(f"{path} -> {export(path)}")
+    else:
+        path = sys.argv[1] if len(sys.argv) > 1 else "supervised_model.keras"
+        policyError, valueError = checkAgainstKeras(path)
+        print(f"largest difference from Keras: policy {policyError:.2e}, value {valueError:.2e}")
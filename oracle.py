@@ -0,0 +1,122 @@
+import sys
+import numpy as np
+from Hexapawn import Board
+
+# solve Hexapawn once and keep the answer. There are only a few hundred reachable positions on the 3x3 board so every one of them can be stored
+# with its perfect play evaluation, best moves and network encoding, and then looked up instantly instead of running the minimax again
+
+DTYPE = np.dtype([
+    ("key", np.uint64), # Board.key of the position, the table is sorted by it
+    ("value", np.int8), # 1 if the player to move wins with perfect play, -1 if they lose
+    ("plies", np.uint8), # length of the rest of the game with perfect play, the winner going for the quickest win and the loser for the longest loss
+    ("terminal", np.bool_),
+    ("bestMoves", np.uint64), # bit i set if the move with network output index i keeps the value, 64 bits is enough for boards up to 5x5
+    ("encoding", np.uint64), # Board.toNetworkInput packed into bits, entry i in bit i
+])
+
+
+def solve(board, records=None):
+    """
+    negamax over every position reachable from board, memoized on Board.key so transposed positions are only solved once.
+    Fills records with key -> (value, plies, terminal, bestMoves, encoding) and returns the records
+    """
+    if records is None:
+        records = {}
+    _solve(board, records)
+    return records
+
+
+def _solve(board, records):
+    key = board.key()
+    if key in records:
+        return records[key]
+
+    encoding = 0
+    for i, bit in enumerate(board.toNetworkInput()):
+        encoding |= bit << i
+
+    terminal, winner = board.isTerminal()
+    if terminal:
+        record = (1 if winner == board.turn else -1, 0, True, 0, encoding)
+    else:
+        results = []
+        for move, index in zip(board.generateMoves(), board.moveIndices()):
+            board.applymove(move)
+            child = _solve(board, records)
+            board.undomove()
+            results.append((index, -child[0], child[1] + 1)) # negamax, the child's value is from the opponent's point of view
+        value = max(result[1] for result in results)
+        bestMoves = 0
+        for (index, childValue, _) in results:
+            if childValue == value:
+                bestMoves |= 1 << index
+        lengths = [plies for (_, childValue, plies) in results if childValue == value]
+        record = (value, min(lengths) if value > 0 else max(lengths), False, bestMoves, encoding)
+
+    records[key] = record
+    return record
+
+
+def build(path="oracle.npy", width=3, height=3):
+    """
+    solves the game from the starting position and writes the table to path sorted by key. Returns the table
+    """
+    board = Board(width, height)
+    board.setStartingPosition()
+    records = solve(board)
+    table = np.array([(key,) + record for key, record in sorted(records.items())], dtype=DTYPE)
+    np.save(path, table)
+    return table
+
+
+class OracleTable:
+    """
+    the solved game loaded from the file written by build. The file is memory-mapped so only the parts of it that get looked up are read,
+    and lookups are a binary search over the sorted keys. The file doesn't record the board size so it has to be given when it isn't 3x3
+    """
+
+    def __init__(self, path="oracle.npy", width=3, height=3):
+        self.table = np.load(path, mmap_mode="r")
+        self.keys = self.table["key"]
+        self.board = Board(width, height) # only used for its sizes
+
+    def __len__(self):
+        return len(self.table)
+
+    def lookup(self, board):
+        """
+        returns the table entry of the position, its fields are named as in DTYPE. Raises a KeyError for positions that can't be reached from the start
+        """
+        key = board.key()
+        i = np.searchsorted(self.keys, key)
+        if i == len(self.keys) or self.keys[i] != key:
+            raise KeyError(key)
+        return self.table[i]
+
+    def value(self, board):
+        return int(self.lookup(board)["value"])
+
+    def bestMoves(self, board):
+        """
+        every move of the position that keeps the perfect play result
+        """
+        bestMoves = int(self.lookup(board)["bestMoves"])
+        return [move for move, index in zip(board.generateMoves(), board.moveIndices()) if (bestMoves >> index) & 1]
+
+    def trainingData(self):
+        """
+        the non-terminal positions in the same format as the minimax training data: network inputs, move probabilities and values.
+        Unlike the minimax, which only marks the first best move it finds, the probability is split evenly over all best moves
+        """
+        positions = self.table[~self.table["terminal"]]
+        inputs = ((positions["encoding"][:, np.newaxis] >> np.arange(self.board.inputSize, dtype=np.uint64)) & 1).astype(np.int64)
+        moveProb = ((positions["bestMoves"][:, np.newaxis] >> np.arange(self.board.policySize, dtype=np.uint64)) & 1).astype(np.float64)
+        moveProb /= moveProb.sum(axis=1, keepdims=True)
+        return inputs, moveProb, positions["value"].astype(np.int64)
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else "oracle.npy"
+    width, height = (int(sys.argv[2]), int(sys.argv[3])) if len(sys.argv) > 3 else (3, 3)
+    table = build(path, width, height)
+    print(f"solved {len(table)} positions ({int((~table['terminal']).sum())} non-terminal) into {path}")
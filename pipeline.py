@@ -0,0 +1,115 @@
+import multiprocessing
+import queue
+import time
+from mcts import ReinfLearn
+from numpynet import NumpyNetwork
+from symmetry import SymmetricNetwork, augment
+from training import TrainingScheduler
+
+# the Reinforcement Learning of main.py alternates between playing games and training on them, so the cores sit idle during the training
+# and the training waits for the games. Here producer processes keep playing self-play games the whole time while the trainer fits the model on what they
+# have played so far. Whenever the trainer finishes a generation the new weights are sent to the producers as NumPy arrays, which they swap in between games.
+# Every game is tagged with the generation of the weights that played it, and games from more than maxStaleness generations back are not trained on
+
+
+def _produce(network, generation, weights, results, stop, tableSize, width, height, budget):
+    """
+    body of a producer process. Plays games until stop is set, after every game it picks up the newest weights waiting in its weights queue, if any.
+    Puts (generation, game data) on the results queue, waiting while it is full
+    """
+    learner = ReinfLearn(SymmetricNetwork(network, width=width, height=height), tableSize, width, height)
+    while not stop.is_set():
+        try:
+            while True: # only the last of several waiting updates matters
+                generation, network = weights.get_nowait()
+                learner.model = SymmetricNetwork(network, width=width, height=height) # a new cache, the old one holds the evaluations of the old weights
+        except queue.Empty:
+            pass
+        results.put((generation, learner.playGame(budget)))
+
+
+class Pipeline:
+    """
+    runs self-play on producer processes and trains model on the main process at the same time. model is a compiled Keras model, only the trainer uses it
+    through the TrainingScheduler scheduler, the producers play with NumpyNetwork copies of its weights.
+    Games go into the ReplayBuffer buffer with their mirror images, tagged with their generation
+    """
+
+    def __init__(self, model, buffer, producers=None, gamesPerGeneration=20, maxStaleness=1, halfLife=100, scheduler=None,
+                 tableSize=None, width=3, height=3, budget=None):
+        """
+        every generation trains on at least gamesPerGeneration new games, played by the current weights or ones at most maxStaleness generations older,
+        with the samples weighted by recency with halfLife. producers defaults to one less than the number of cores so the trainer keeps one for itself
+        """
+        self.model = model
+        self.buffer = buffer
+        self.producers = producers or max(1, multiprocessing.cpu_count() - 1)
+        self.gamesPerGeneration = gamesPerGeneration
+        self.maxStaleness = maxStaleness
+        self.halfLife = halfLife
+        self.scheduler = scheduler or TrainingScheduler(model)
+        self.tableSize = tableSize
+        self.width = width
+        self.height = height
+        self.budget = budget
+        self.generation = 0
+        self.stale = 0 # games thrown away because the weights that played them were too old
+
+    def run(self, generations=10):
+        """
+        trains generations generations and yields the generation number after each one, the model then holds its weights and can be saved
+        """
+        context = multiprocessing.get_context("spawn") # like the SelfPlayPool, forking a process with TensorFlow loaded tends to hang
+        results = context.Queue(10 * self.gamesPerGeneration) # as many games as a collect takes, producers that get that far ahead wait for the trainer
+        stop = context.Event()
+        weightQueues = [context.Queue() for _ in range(self.producers)]
+        network = NumpyNetwork.fromModel(self.model)
+        processes = [context.Process(target=_produce, daemon=True,
+                                     args=(network, self.generation, weights, results, stop, self.tableSize, self.width, self.height, self.budget))
+                     for weights in weightQueues]
+        for process in processes:
+            process.start()
+        try:
+            for _ in range(generations):
+                start = time.perf_counter()
+                self.collect(results, processes)
+                waited = time.perf_counter() - start
+                minGeneration = self.generation - self.maxStaleness
+                self.scheduler.fitBuffer(self.buffer, self.halfLife, minGeneration)
+                self.generation += 1
+                network = NumpyNetwork.fromModel(self.model)
+                for weights in weightQueues:
+                    weights.put((self.generation, network))
+                print(f"generation {self.generation}: waited {waited:.1f}s for games, trained for {time.perf_counter() - start - waited:.1f}s, "
+                      f"{len(self.buffer)} positions in the buffer, {self.stale} stale games dropped")
+                yield self.generation - 1
+        finally:
+            stop.set()
+            while any(process.is_alive() for process in processes): # keep emptying the queue, a producer can't exit while its last game is still unsent
+                try:
+                    results.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            for process in processes:
+                process.join()
+
+    def collect(self, results, processes):
+        """
+        adds finished games to the buffer until gamesPerGeneration of them are recent enough, then also takes the rest of the games that are already waiting
+        (up to 10 generations worth) as they were played while the last generation was training. So this only blocks when the self-play is the slower side
+        """
+        games = 0
+        while games < 10 * self.gamesPerGeneration:
+            try:
+                generation, data = results.get(timeout=1) if games < self.gamesPerGeneration else results.get_nowait()
+            except queue.Empty:
+                if games >= self.gamesPerGeneration:
+                    break
+                if not any(process.is_alive() for process in processes):
+                    raise RuntimeError("every self-play producer has died")
+                continue
+            if generation < self.generation - self.maxStaleness:
+                self.stale += 1
+                continue
+            self.buffer.add(*augment(*data, width=self.width, height=self.height), generation=generation)
+            games += 1
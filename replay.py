@@ -0,0 +1,151 @@
+import json
+import os
+import numpy as np
+
+# a replay buffer for the Reinforcement Learning. Instead of training only on the games of the latest iteration and throwing them away,
+# the positions of every game go into a fixed size ring buffer on disk and training batches are drawn from it.
+# The arrays are memory-mapped .npy files so the buffer can be much bigger than what should be kept in RAM, and it survives restarts
+
+
+class ReplayBuffer:
+    """
+    ring buffer of (network input, move probabilities, value) samples kept in memory-mapped .npy files inside directory.
+    Once capacity samples are stored the oldest ones are overwritten. Every sample also gets the running count of samples added before it,
+    which gives its age for the recency-weighted sampling, and the generation of the model that played it so samples from too old a model can be left out
+    """
+
+    def __init__(self, directory, capacity=10000, inputSize=18, policySize=14):
+        """
+        opens the buffer in directory if there is one, otherwise creates an empty one. inputSize and policySize are Board.inputSize and Board.policySize.
+        An existing buffer has to have been created with the same capacity and sizes, a ValueError is raised otherwise
+        """
+        self.directory = directory
+        self.metaPath = os.path.join(directory, "meta.json")
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self.metaPath):
+            with open(self.metaPath) as f:
+                meta = json.load(f)
+            self.capacity = meta["capacity"]
+            self.count = meta["count"]
+            mode = "r+"
+        else:
+            self.capacity = capacity
+            self.count = 0 # samples added since the buffer was created, including overwritten ones
+            mode = "w+"
+        self.inputs = self.open("inputs", mode, np.int8, (self.capacity, inputSize))
+        self.moveProbs = self.open("moveProbs", mode, np.float32, (self.capacity, policySize))
+        self.values = self.open("values", mode, np.float32, (self.capacity,))
+        self.order = self.open("order", mode, np.int64, (self.capacity,))
+        self.generations = self.open("generations", mode, np.int32, (self.capacity,))
+        shapes = (self.inputs.shape, self.moveProbs.shape, self.values.shape, self.order.shape, self.generations.shape)
+        if (capacity, inputSize, policySize) != (self.capacity, self.inputs.shape[1], self.moveProbs.shape[1]) or len(set(shape[0] for shape in shapes)) != 1:
+            raise ValueError(f"the replay buffer in {directory} holds {self.capacity} samples of {self.inputs.shape[1]} inputs and {self.moveProbs.shape[1]} policy outputs, "
+                             f"not {capacity} of {inputSize} and {policySize}. Delete the directory to start a new one")
+        self.writeMeta()
+
+    def open(self, name, mode, dtype, shape):
+        path = os.path.join(self.directory, name + ".npy")
+        if mode == "r+" and os.path.exists(path): # buffers written before the generations were recorded don't have that file yet
+            return np.lib.format.open_memmap(path, mode="r+")
+        return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+
+    def writeMeta(self):
+        with open(self.metaPath, "w") as f:
+            json.dump({"capacity": self.capacity, "count": self.count}, f)
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def clear(self):
+        self.count = 0
+        self.writeMeta()
+
+    def add(self, positionData, moveProbData, valueData, generation=0):
+        """
+        appends the samples of a game, takes the tuple returned by ReinfLearn.playGame unpacked and the generation of the model that played the game
+        """
+        n = len(positionData)
+        slots = (self.count + np.arange(n)) % self.capacity # where the samples go, wrapping around to overwrite the oldest
+        self.inputs[slots] = positionData
+        self.moveProbs[slots] = moveProbData
+        self.values[slots] = valueData
+        self.order[slots] = self.count + np.arange(n)
+        self.generations[slots] = generation
+        self.count += n
+        self.flush()
+
+    def flush(self):
+        for array in (self.inputs, self.moveProbs, self.values, self.order, self.generations):
+            array.flush()
+        self.writeMeta()
+
+    def eligible(self, minGeneration=None):
+        """
+        slots of the samples played by generation minGeneration or later, all of them if it is None
+        """
+        if minGeneration is None:
+            return np.arange(len(self))
+        return np.flatnonzero(self.generations[:len(self)] >= minGeneration)
+
+    def sample(self, batchSize, halfLife=None, rng=np.random, minGeneration=None):
+        """
+        draws batchSize samples with replacement, only from the ones played by generation minGeneration or later if it is given.
+        Uniformly by default, or weighted by recency if halfLife is given: a sample halfLife samples older than the newest one is half as likely to be drawn
+        """
+        slots = self.eligible(minGeneration)
+        if len(slots) == 0:
+            raise ValueError(f"no samples from generation {minGeneration} or later in the replay buffer")
+        if halfLife is None:
+            indices = slots[rng.randint(0, len(slots), batchSize)]
+        else:
+            age = (self.count - 1) - self.order[slots]
+            weights = 0.5 ** (age / halfLife)
+            indices = slots[rng.choice(len(slots), batchSize, p=weights / weights.sum())]
+        return self.inputs[indices], self.moveProbs[indices], self.values[indices]
+
+    def recencyWeights(self, slots, halfLife=None):
+        """
+        weight of the samples in slots: their chance of being drawn by sample with that halfLife relative to the newest sample, or all ones without a halfLife
+        """
+        if halfLife is None:
+            return np.ones(len(slots), dtype=np.float32)
+        return (0.5 ** (((self.count - 1) - self.order[slots]) / halfLife)).astype(np.float32)
+
+    def generator(self, batchSize=16, halfLife=None, minGeneration=None, slots=None, rng=np.random):
+        """
+        endless stream of training batches in the (inputs, (moveProbs, values), (weights, weights)) form model.fit takes, used with steps_per_epoch.
+        The samples are drawn uniformly from the ones from generation minGeneration on, or from slots if given (the training part of a split for instance),
+        and each carries its recency weight for both heads, which over many batches trains the same as drawing them by recency with sample.
+        Only the rows of each batch are read from the files
+        """
+        if slots is None:
+            slots = self.eligible(minGeneration)
+        if len(slots) == 0:
+            raise ValueError(f"no samples from generation {minGeneration} or later in the replay buffer")
+        weights = self.recencyWeights(slots, halfLife)
+        while True:
+            picks = rng.randint(0, len(slots), batchSize)
+            indices = slots[picks]
+            batchWeights = weights[picks]
+            yield self.inputs[indices].astype(np.float32), (self.moveProbs[indices], self.values[indices]), (batchWeights, batchWeights)
+
+    def stepsPerEpoch(self, batchSize=16, minGeneration=None, slots=None):
+        """
+        number of batches for model.fit to count as one pass over the buffer, over the part of it from generation minGeneration on or over slots
+        """
+        samples = len(self.eligible(minGeneration)) if slots is None else len(slots)
+        return max(1, -(-samples // batchSize))
+
+    def dataset(self, batchSize=16, halfLife=None, minGeneration=None, slots=None):
+        """
+        the generator wrapped in a tf.data.Dataset so TensorFlow can prefetch the next batch while training on the current one
+        """
+        import tensorflow as tf
+
+        inputSize = self.inputs.shape[1]
+        policySize = self.moveProbs.shape[1]
+        signature = (tf.TensorSpec((None, inputSize), tf.float32),
+                     (tf.TensorSpec((None, policySize), tf.float32), tf.TensorSpec((None,), tf.float32)),
+                     (tf.TensorSpec((None,), tf.float32), tf.TensorSpec((None,), tf.float32)))
+        return tf.data.Dataset.from_generator(lambda: self.generator(batchSize, halfLife, minGeneration, slots),
+                                              output_signature=signature).prefetch(tf.data.AUTOTUNE)
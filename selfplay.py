@@ -0,0 +1,71 @@
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from mcts import ReinfLearn
+from numpynet import loadNetwork
+from symmetry import SymmetricNetwork
+
+# run the self-play games of the Reinforcement Learning on several processes at once.
+# Every game is independent of the others so they can be spread over all the cores, the only thing the workers share is the saved model
+
+_learner = None # the ReinfLearn of a worker process, created once by _initWorker and then used for every game that worker plays
+
+
+def _initWorker(modelPath, tableSize, width, height):
+    """
+    runs once in every worker process. Loads the weights from the model's .keras or exported .npz file so they aren't reloaded for every game.
+    The games only ever evaluate one position at a time so the NumpyNetwork is used instead of Keras, it also keeps each worker to a single thread
+    and TensorFlow out of the workers altogether.
+    Its evaluations are cached by SymmetricNetwork, which is safe as a pool only ever plays with one model
+    """
+    global _learner
+    _learner = ReinfLearn(SymmetricNetwork(loadNetwork(modelPath), width=width, height=height), tableSize, width, height)
+
+
+def _playGame(_):
+    return _learner.playGame()
+
+
+class SelfPlayPool:
+    """
+    a pool of worker processes playing ReinfLearn games with the model saved at modelPath.
+    The processes are started with spawn rather than fork as forking a process that already has TensorFlow loaded tends to hang.
+    Should be used as a context manager so the processes are shut down afterwards
+    """
+
+    def __init__(self, modelPath, processes=None, tableSize=None, width=3, height=3):
+        """
+        processes defaults to the number of cores, tableSize and the board size are passed on to ReinfLearn
+        """
+        context = multiprocessing.get_context("spawn")
+        self.pool = context.Pool(processes, initializer=_initWorker, initargs=(modelPath, tableSize, width, height))
+
+    def playGames(self, games):
+        """
+        plays the given number of games and yields the (positionData, moveProbData, valueData) of each one as soon as it finishes, so not in any particular order
+        """
+        return self.pool.imap_unordered(_playGame, range(games))
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, *exc):
+        if excType is not None: # don't wait for the remaining games if something went wrong
+            self.pool.terminate()
+        self.close()
+
+
+def playGamesConcurrently(network, games, threads=16, tableSize=None, width=3, height=3):
+    """
+    plays the games on threads of the current process instead of separate processes. Only worth it when network is an InferenceServer,
+    the searches then wait on the network at the same time and their positions get evaluated together in one batch.
+    Yields the data of each game as it finishes just like SelfPlayPool.playGames
+    """
+    learner = ReinfLearn(network, tableSize, width, height)
+    with ThreadPoolExecutor(threads) as executor:
+        futures = [executor.submit(learner.playGame) for _ in range(games)]
+        for future in as_completed(futures):
+            yield future.result()
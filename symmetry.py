@@ -0,0 +1,97 @@
+from collections import OrderedDict
+import numpy as np
+from Hexapawn import Geometry
+
+# Hexapawn looks exactly the same in a mirror, swapping the left and right side of the board changes nothing about who wins or which moves are good.
+# So every position and its mirror image can share a single network evaluation, and every training sample gives a second one for free.
+# Mirroring commutes with the rotation toNetworkInput does for black, so the mirror of a network input is just the mirror of each half
+
+
+def inputMirror(width=3, height=3):
+    """
+    column permutation that mirrors network inputs, inputs[:, inputMirror()] is the input of the mirrored position
+    """
+    geometry = Geometry.get(width, height)
+    return np.array(geometry.mirrorSquares + [geometry.squares + i for i in geometry.mirrorSquares])
+
+
+def mirrorPolicy(policy, width=3, height=3):
+    """
+    mirrors a policy vector, or the last axis of an array of them, so the probability of each move goes to its mirrored move.
+    Doing it twice gives back the original
+    """
+    return np.asarray(policy)[..., Geometry.get(width, height).policyMirror]
+
+
+def augment(positionData, moveProbData, valueData, width=3, height=3):
+    """
+    adds the mirror image of every sample to the training data, takes and returns lists like the ones from ReinfLearn.playGame.
+    Positions that are their own mirror image are left out as they would only be duplicates
+    """
+    inputs = np.asarray(positionData)
+    mirroredInputs = inputs[:, inputMirror(width, height)]
+    mirroredProbs = mirrorPolicy(moveProbData, width, height)
+    different = (inputs != mirroredInputs).any(axis=1)
+    return (list(positionData) + mirroredInputs[different].tolist(),
+            list(moveProbData) + mirroredProbs[different].tolist(),
+            list(valueData) + np.asarray(valueData)[different].tolist())
+
+
+class SymmetricNetwork:
+    """
+    wraps a network and caches its evaluations by canonical position, a position and its mirror share one cache entry and one network call.
+    The canonical form is whichever of the network input and its mirror is smaller when read as bits, so it works on the inputs alone and can stand in
+    for the network anywhere: MCTS, ReinfLearn, the Engine or rand_vs_network. The cache holds at most maxSize positions and drops the least recently used.
+    It has to be thrown away when the network is trained as the cached outputs go stale
+    """
+
+    def __init__(self, network, maxSize=100000, width=3, height=3):
+        self.network = network
+        self.maxSize = maxSize
+        self.width = width
+        self.height = height
+        self.mirror = inputMirror(width, height)
+        self.policyMirror = Geometry.get(width, height).policyMirror
+        self.cache = OrderedDict() # canonical input bytes -> (policy, value)
+        self.hits = 0
+        self.misses = 0
+
+    def predict(self, x, verbose=0):
+        x = np.asarray(x, dtype=np.float32)
+        if x.ndim == 1:
+            x = x[np.newaxis]
+        mirrored = x[:, self.mirror]
+        keys = []
+        flips = []
+        for row, mirroredRow in zip(np.packbits(x.astype(np.uint8), axis=1), np.packbits(mirrored.astype(np.uint8), axis=1)):
+            key, mirroredKey = row.tobytes(), mirroredRow.tobytes()
+            keys.append(min(key, mirroredKey))
+            flips.append(mirroredKey < key)
+
+        missing = [] # rows that need the network, only the first of each canonical position
+        seen = set()
+        for i, key in enumerate(keys):
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.hits += 1
+            elif key not in seen:
+                seen.add(key)
+                missing.append(i)
+                self.misses += 1
+            else:
+                self.hits += 1
+        if missing:
+            canonical = np.array([mirrored[i] if flips[i] else x[i] for i in missing])
+            policy, value = self.network.predict(canonical, verbose=0)
+            for j, i in enumerate(missing):
+                self.cache[keys[i]] = (np.asarray(policy[j]), np.asarray(value[j]))
+
+        policies = []
+        values = []
+        for key, flip in zip(keys, flips):
+            policy, value = self.cache[key]
+            policies.append(policy[self.policyMirror] if flip else policy) # turn the canonical policy back into the orientation that was asked for
+            values.append(value)
+        while len(self.cache) > self.maxSize: # only evict once everything asked for has been read back
+            self.cache.popitem(last=False)
+        return [np.array(policies), np.array(values)]
@@ -0,0 +1,123 @@
+import math
+import time
+import numpy as np
+from instrument import stats
+
+# model.fit with a fixed 512 epochs keeps training long after the loss has stopped going down, and that training is most of the time of every
+# Reinforcement Learning iteration. The scheduler holds back part of the data to validate on, stops once the validation loss hasn't improved for a while
+# and sizes the batches to the amount of data. It keeps the same compiled model for every fit, so each one starts from the weights and the optimizer state
+# the last one left behind (a .keras file saved with model.save keeps the optimizer state too, so a loaded model continues the same way)
+
+
+class TrainingScheduler:
+    """
+    fits model until its validation loss, the sum of the policy and value losses, hasn't improved by minDelta for patience epochs, or maxEpochs at most.
+    The weights of the epoch with the lowest validation loss are kept, whether the patience or maxEpochs ends the fit. The batch size is picked so an epoch is about stepsPerEpoch batches, between minBatchSize and maxBatchSize.
+    Every fit is printed and kept in self.history, and logged as a "fit" event when the instrument stats are enabled
+    """
+
+    def __init__(self, model, maxEpochs=512, patience=20, minDelta=1e-4, validationSplit=0.1, stepsPerEpoch=8, minBatchSize=16, maxBatchSize=256, seed=0):
+        self.model = model
+        self.maxEpochs = maxEpochs
+        self.patience = patience
+        self.minDelta = minDelta
+        self.validationSplit = validationSplit
+        self.stepsPerEpoch = stepsPerEpoch
+        self.minBatchSize = minBatchSize
+        self.maxBatchSize = maxBatchSize
+        self.rng = np.random.default_rng(seed)
+        self.history = [] # one summary dict per fit
+
+    def batchSize(self, samples):
+        """
+        power of two giving roughly stepsPerEpoch batches for that many training samples
+        """
+        size = 2 ** round(math.log2(max(samples / self.stepsPerEpoch, 1)))
+        return int(min(self.maxBatchSize, max(self.minBatchSize, size)))
+
+    def fit(self, inputs, moveProbs, values, sampleWeights=None):
+        """
+        trains on the given arrays, a shuffled validationSplit of them is held back for the early stopping. sampleWeights weigh how much each sample counts
+        in the training loss. Returns the summary of the fit
+        """
+        inputs = np.asarray(inputs, dtype=np.float32)
+        moveProbs = np.asarray(moveProbs, dtype=np.float32)
+        values = np.asarray(values, dtype=np.float32)
+        train, validation = self.split(len(inputs))
+        batchSize = self.batchSize(len(train))
+        return self.run(len(train), batchSize, inputs[train], [moveProbs[train], values[train]],
+                        sample_weight=None if sampleWeights is None else [np.asarray(sampleWeights)[train]] * 2, # the same weight for both heads
+                        validation_data=(inputs[validation], [moveProbs[validation], values[validation]]), batch_size=batchSize)
+
+    def fitBuffer(self, buffer, halfLife=None, minGeneration=None):
+        """
+        trains on the samples of a ReplayBuffer, only the ones from generation minGeneration on if it is given. The batches are streamed from the
+        memory-mapped files through buffer.dataset, only the held back validation samples are read into memory.
+        With halfLife the samples are weighted by recency the same way ReplayBuffer.sample draws them
+        """
+        slots = buffer.eligible(minGeneration)
+        if len(slots) == 0:
+            raise ValueError(f"no samples from generation {minGeneration} or later in the replay buffer")
+        train, validation = self.split(len(slots))
+        train = slots[train]
+        validation = np.sort(slots[validation]) # sorted so its rows are read from the files in order
+        batchSize = self.batchSize(len(train))
+        return self.run(len(train), batchSize, buffer.dataset(batchSize, halfLife, slots=train),
+                        steps_per_epoch=buffer.stepsPerEpoch(batchSize, slots=train),
+                        validation_data=(buffer.inputs[validation].astype(np.float32), [buffer.moveProbs[validation], buffer.values[validation]]))
+
+    def split(self, samples):
+        """
+        shuffled positions of the training and the validation samples out of samples of them
+        """
+        order = self.rng.permutation(samples)
+        validation = order[:int(samples * self.validationSplit)]
+        train = order[len(validation):]
+        if len(validation) == 0: # too little data to hold any back, early stopping then watches the training loss
+            validation = train
+        return train, validation
+
+    def run(self, samples, batchSize, *data, **fitArguments):
+        """
+        the model.fit with early stopping shared by fit and fitBuffer, data and fitArguments are passed on to it. Records and returns the summary
+        """
+        from tensorflow import keras
+
+        best = {"loss": np.inf, "weights": None}
+        def keepBest(epoch, logs):
+            if logs["val_loss"] < best["loss"]:
+                best["loss"] = logs["val_loss"]
+                best["weights"] = self.model.get_weights()
+
+        start = time.perf_counter()
+        # EarlyStopping only restores the best weights when it is the one that stops the training, not when maxEpochs is reached first,
+        # so the weights of the best epoch are kept here and put back whatever ended the fit
+        stopping = keras.callbacks.EarlyStopping(monitor="val_loss", patience=self.patience, min_delta=self.minDelta)
+        result = self.model.fit(*data, epochs=self.maxEpochs, callbacks=[stopping, keras.callbacks.LambdaCallback(on_epoch_end=keepBest)],
+                                verbose=0, **fitArguments)
+        if best["weights"] is not None:
+            self.model.set_weights(best["weights"])
+        elapsed = time.perf_counter() - start
+
+        losses = result.history["val_loss"]
+        best = int(np.argmin(losses))
+        summary = {
+            "samples": samples,
+            "batchSize": batchSize,
+            "epochs": len(losses),
+            "bestEpoch": best + 1, # the epochs it took to converge, the ones after it only confirmed the plateau
+            "loss": float(result.history["loss"][best]),
+            "valLoss": float(losses[best]),
+            "valPolicyLoss": float(result.history.get("val_policyHead_loss", [np.nan] * len(losses))[best]),
+            "valValueLoss": float(result.history.get("val_valueHead_loss", [np.nan] * len(losses))[best]),
+            "seconds": elapsed,
+        }
+        self.history.append(summary)
+        if stats.enabled:
+            stats.addTime("fit", elapsed)
+            stats.count("fits")
+            stats.count("epochs", summary["epochs"])
+            stats.log("fit", **summary)
+        print(f"fit: converged after {summary['bestEpoch']} epochs ({summary['epochs']} run) in {elapsed:.1f}s, batch size {batchSize}, "
+              f"validation loss {summary['valLoss']:.4f} (policy {summary['valPolicyLoss']:.4f}, value {summary['valValueLoss']:.4f})")
+        return summary